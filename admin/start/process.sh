@@ -40,6 +40,11 @@ REQUIREMENTS=$(jq -r '.REQUIREMENTS | join("\n")' "$CONFIG_FILE")
 mkdir "$PROCESS_NAME"
 cd "$PROCESS_NAME"
 
+# Las imagenes se construyen desde la raiz del repositorio sobre la imagen base (docker/base)
+ROOT_DIR=$(git rev-parse --show-toplevel)
+MODULE_PATH=$(realpath --relative-to="$ROOT_DIR" "$(pwd)")
+BUILD_CONTEXT=$(realpath --relative-to="$(pwd)" "$ROOT_DIR")
+
 # Crear directorio app
 mkdir app
 cd app
@@ -96,14 +101,19 @@ touch Dockerfile
 
 # Escribir en Dockerfile
 cat <<EOF > Dockerfile
-FROM python:3.9
+ARG BASE_IMAGE=clbb-base:latest
+FROM \${BASE_IMAGE}
 
 WORKDIR /app
 
-COPY requirements.txt requirements.txt
+COPY $MODULE_PATH/requirements.txt requirements.txt
 RUN pip install -r requirements.txt
 
-COPY ./app /app
+COPY runtime /runtime
+RUN pip install --no-deps /runtime
+
+COPY $MODULE_PATH/app /app
+RUN python -m compileall -q /app
 
 CMD ["python", "main.py"]
 EOF
@@ -121,7 +131,9 @@ version: "3"
 services:
   app:
     container_name: $PROCESS_NAME
-    build: .
+    build:
+      context: $BUILD_CONTEXT
+      dockerfile: $MODULE_PATH/Dockerfile
     env_file:
       - .env
     networks:
@@ -0,0 +1,196 @@
+"""Benchmark the indicator modules against synthetic data and a local API.
+
+    python -m benchmarks.run --sizes 10000 100000 --kind grid --output bench_report.json
+
+Every module runs in-process against the stand-in server; each lifecycle
+phase is timed (wall and CPU) and written to a JSON report, together with
+the memory of every output frame per column (phase 'memory'). The import of
+every module is also measured in a fresh interpreter (python -X importtime)
+and reported per top-level package under 'imports'. Every request is logged
+under 'requests' with its wire and decoded sizes, which shows the effect of
+api_compression (e.g. --env api_compression=auto to compress request bodies, or
+--env api_compression=identity for a run without any compression).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from datetime import datetime, timezone
+
+from benchmarks.stand_in import StandInAPI, to_features, to_single_feature
+from benchmarks.synthetic import SyntheticCity
+from clbb_runtime.frames import memory_report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = [
+    'am_prox_by_node_points',
+    'am_prox_grid_points',
+    'am_prox_aggregation',
+    'separate_am_prox',
+    'ga_prox_by_node_points',
+    'ga_prox_grid_points',
+    'ga_prox_aggregation',
+]
+
+PHASES = {
+    'separate_am_prox': ['load_data', 'separate_and_export'],
+}
+DEFAULT_PHASES = ['load_data', 'calculate', 'export_indicator']
+
+MODULE_ENV = {
+    'am_prox_grid_points': {'x_spacing': '50', 'y_spacing': '50'},
+    'ga_prox_grid_points': {'x_spacing': '50', 'y_spacing': '50'},
+    'am_prox_aggregation': {'indicator_to_aggregate': 'am_prox_grid_points'},
+    'ga_prox_aggregation': {'indicator_to_aggregate': 'ga_prox_grid_points'},
+    'separate_am_prox': {'indicator_to_separate': 'am_prox_grid_points'},
+}
+
+
+def load_module(module_name):
+    path = os.path.join(ROOT, 'indicators', module_name, 'app', 'indicator.py')
+    spec = importlib.util.spec_from_file_location(f'bench_{module_name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_report(module_name, top=10):
+    path = os.path.join(ROOT, 'indicators', module_name, 'app', 'indicator.py')
+    code = (
+        'import importlib.util;'
+        f'spec = importlib.util.spec_from_file_location("bench_{module_name}", {path!r});'
+        'spec.loader.exec_module(importlib.util.module_from_spec(spec))'
+    )
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    packages = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Solo los paquetes importados directamente (sin sangria) suman al total
+        if not name.startswith('  '):
+            packages.append({'package': name.strip(), 'cumulative_s': int(cumulative) / 1e6})
+    packages.sort(key=lambda p: p['cumulative_s'], reverse=True)
+    return {
+        'module': module_name,
+        'ok': proc.returncode == 0,
+        'total_s': sum(p['cumulative_s'] for p in packages),
+        'top': packages[:top],
+    }
+
+
+def make_env(api, module_name, args):
+    env = {
+        'server_address': api.address,
+        'project_name': 'benchmark',
+        'project_status': "{'scenario': 'base'}",
+        'indicator_name': module_name,
+        'network_id': '1',
+        'speed': '4.5',
+        'resolution': '10',
+        'aggregation_unit': 'square',
+        'metrics_log': 'none',
+    }
+    env.update(MODULE_ENV.get(module_name, {}))
+    env.update(args.env)
+    return env
+
+
+def timed(fn, *args):
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = fn(*args)
+    return result, time.perf_counter() - wall, time.process_time() - cpu
+
+
+def run_module(api, module_name, args, meta):
+    records = []
+    os.environ.update(make_env(api, module_name, args))
+    try:
+        module, wall, cpu = timed(load_module, module_name)
+        records.append(dict(meta, module=module_name, phase='import', wall_s=wall, cpu_s=cpu))
+        indicator = module.Indicator()
+        for phase in PHASES.get(module_name, DEFAULT_PHASES):
+            _, wall, cpu = timed(getattr(indicator, phase))
+            df_out = getattr(indicator, 'df_out', None)
+            rows = len(df_out) if df_out is not None else None
+            records.append(dict(meta, module=module_name, phase=phase, wall_s=wall, cpu_s=cpu, rows=rows))
+        df_out = getattr(indicator, 'df_out', None)
+        if df_out is not None:
+            records.append(dict(meta, module=module_name, phase='memory', **memory_report(df_out)))
+        recorder = getattr(indicator, 'recorder', None)
+        if recorder is not None:
+            steps = [{k: r[k] for k in ('step', 'wall_s', 'cpu_s', 'rows', 'peak_rss_bytes')} for r in recorder.records]
+            records += [dict(meta, module=module_name, phase='step', **step) for step in steps]
+    except Exception as e:
+        traceback.print_exc()
+        records.append(dict(meta, module=module_name, phase='error', error=repr(e)))
+    return records
+
+
+def build_api(city, tmpdir, args):
+    api = StandInAPI(encodings=args.api_encodings)
+    api.add_network(1, city.save_network_h5(os.path.join(tmpdir, 'net_1.h5')))
+    api.add_layer('areaofinterest', to_single_feature(city.area_of_interest(args.aoi_fraction)))
+    api.add_layer('amenity', to_features(city.amenities(args.amenities)))
+    api.add_layer('greenarea', to_features(city.green_areas(args.green_areas)))
+    api.add_layer('discretedistribution', to_features(city.units(args.unit_size, level=10)))
+    return api
+
+
+def run(args):
+    report = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'args': {k: v for k, v in vars(args).items() if k != 'env'},
+        'results': [],
+        'requests': [],
+        'imports': [import_report(module_name) for module_name in args.modules] if args.import_report else [],
+    }
+    for size in args.sizes:
+        meta = {'kind': args.kind, 'size': size}
+        city, wall, cpu = timed(SyntheticCity, size, args.kind)
+        report['results'].append(dict(meta, module='synthetic', phase='generate', wall_s=wall, cpu_s=cpu))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with build_api(city, tmpdir, args) as api:
+                for module_name in args.modules:
+                    report['results'] += run_module(api, module_name, args, meta)
+                report['requests'] += [dict(meta, **r) for r in api.requests_log]
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f'Report written to {args.output}')
+    return report
+
+
+def parse_env(values):
+    return dict(v.split('=', 1) for v in values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--kind', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--amenities', type=int, default=200)
+    parser.add_argument('--green-areas', type=int, default=50)
+    parser.add_argument('--aoi-fraction', type=float, default=0.1)
+    parser.add_argument('--unit-size', type=float, default=250.0)
+    parser.add_argument('--api-encodings', nargs='*', default=['zstd', 'gzip'], help='encodings the stand-in accepts and serves')
+    parser.add_argument('--env', nargs='*', default=[], help='extra KEY=VALUE variables for every module')
+    parser.add_argument('--no-import-report', dest='import_report', action='store_false')
+    parser.add_argument('--output', default='bench_report.json')
+    args = parser.parse_args()
+    args.env = parse_env(args.env)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
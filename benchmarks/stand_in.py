@@ -0,0 +1,199 @@
+import gzip
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def decode_body(encoding, body):
+    if encoding == 'zstd':
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    if encoding == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+def encode_body(encoding, body):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
+
+
+def negotiate(accept_encoding, encodings):
+    """First of ``encodings`` listed in an Accept-Encoding header, or 'identity'."""
+    accepted = {item.split(';')[0].strip() for item in (accept_encoding or '').split(',')}
+    return next((encoding for encoding in encodings if encoding in accepted), 'identity')
+
+
+def to_features(gdf):
+    """Serialize a GeoDataFrame the way the backend does (EWKT geometries)."""
+    features = []
+    for i, (props, geom) in enumerate(zip(gdf.drop(columns='geometry').to_dict('records'), gdf.geometry)):
+        features.append({
+            'id': i + 1,
+            'type': 'Feature',
+            'geometry': f'SRID=4326;{geom.wkt}',
+            'properties': props,
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def to_single_feature(gdf):
+    row = to_features(gdf.iloc[:1])['features'][0]
+    return {'id': row['id'], 'geometry': row['geometry'], 'properties': row['properties']}
+
+
+class StandInAPI():
+    """Local stand-in for the ``/api`` and ``/urban-indicators`` endpoints.
+
+    Layers are registered as already serialized payloads. Uploaded indicator
+    data is kept in memory under (indicator_name, indicator_hash) and served
+    back on the indicatordata GET, so chained modules can run against it.
+    The routes live in ``self.routes`` (regex -> callable) so they can be
+    adjusted if the client library asks for different paths.
+
+    Like the backend behind a compressing proxy, request bodies in any of
+    ``encodings`` are decoded (other encodings get 415) and responses of at
+    least ``min_bytes`` are compressed when the client accepts it. The log
+    keeps wire and decoded sizes of every request.
+    """
+    def __init__(self, host='127.0.0.1', port=0, encodings=('zstd', 'gzip'), min_bytes=1024):
+        self.layers = {}
+        self.files = {}
+        self.indicators = {}
+        self.requests_log = []
+        self.lock = threading.Lock()
+        self.encodings = [encoding for encoding in encodings if encoding != 'zstd' or zstandard is not None]
+        self.min_bytes = min_bytes
+        self.routes = {
+            ('GET', r'^/api/roadnetwork/(?P<id>\d+)/serve_h5_file/?$'): self.serve_network,
+            ('GET', r'^/api/areaofinterest/(?P<id>\d+)/?$'): self.serve_layer('areaofinterest'),
+            ('GET', r'^/api/amenity/?$'): self.serve_layer('amenity'),
+            ('GET', r'^/api/greenarea/?$'): self.serve_layer('greenarea'),
+            ('GET', r'^/api/discretedistribution/?$'): self.serve_layer('discretedistribution'),
+            ('GET', r'^/urban-indicators/indicatordata/.*$'): self.serve_indicator,
+            ('POST', r'^/urban-indicators/indicatordata/(upload_to_table|update_indicator)/?$'): self.store_indicator,
+        }
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.address = f'http://{host}:{self.server.server_address[1]}'
+        pass
+
+    def add_layer(self, name, payload):
+        self.layers[name] = json.dumps(payload).encode()
+        pass
+
+    def add_network(self, id_network, filename):
+        with open(filename, 'rb') as f:
+            self.files[str(id_network)] = f.read()
+        pass
+
+    def serve_layer(self, name):
+        def handler(match, query, body):
+            if name not in self.layers:
+                return 404, b'{}', 'application/json'
+            return 200, self.layers[name], 'application/json'
+        return handler
+
+    def serve_network(self, match, query, body):
+        content = self.files.get(match.group('id'))
+        if content is None:
+            return 404, b'', 'application/octet-stream'
+        return 200, content, 'application/octet-stream'
+
+    def serve_indicator(self, match, query, body):
+        key = (query.get('indicator_name', [None])[0], query.get('indicator_hash', [None])[0])
+        with self.lock:
+            data = self.indicators.get(key)
+        if data is None:
+            return 404, b'{}', 'application/json'
+        return 200, data.encode(), 'application/json'
+
+    def store_indicator(self, match, query, body):
+        data = json.loads(body)
+        key = (data['indicator_name'], data['indicator_hash'])
+        with self.lock:
+            self.indicators[key] = data['json_data']
+        return 200, b'{"status": "ok"}', 'application/json'
+
+    def dispatch(self, method, path, body):
+        url = urlparse(path)
+        query = parse_qs(url.query)
+        for (route_method, pattern), handler in self.routes.items():
+            match = re.match(pattern, url.path)
+            if route_method == method and match:
+                return handler(match, query, body)
+        return 404, b'{"detail": "Not found"}', 'application/json'
+
+    def make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, method):
+                length = int(self.headers.get('Content-Length', 0))
+                wire = self.rfile.read(length) if length else b''
+                request_encoding = self.headers.get('Content-Encoding', 'identity')
+                if request_encoding != 'identity' and request_encoding not in api.encodings:
+                    status, content, content_type = 415, b'{"detail": "Unsupported Content-Encoding"}', 'application/json'
+                    body = wire
+                else:
+                    body = decode_body(request_encoding, wire)
+                    status, content, content_type = api.dispatch(method, self.path, body)
+
+                response_encoding = negotiate(self.headers.get('Accept-Encoding'), api.encodings)
+                if len(content) < api.min_bytes:
+                    response_encoding = 'identity'
+                payload = encode_body(response_encoding, content)
+                with api.lock:
+                    api.requests_log.append({
+                        'method': method,
+                        'path': self.path,
+                        'status': status,
+                        'request_encoding': request_encoding,
+                        'request_bytes': len(wire),
+                        'request_decoded_bytes': len(body),
+                        'response_encoding': response_encoding,
+                        'response_bytes': len(payload),
+                        'response_decoded_bytes': len(content),
+                    })
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                if response_encoding != 'identity':
+                    self.send_header('Content-Encoding', response_encoding)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self.respond('GET')
+
+            def do_POST(self):
+                self.respond('POST')
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
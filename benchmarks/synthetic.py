@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import box
+
+# Centro de Concepcion en UTM 18S, el mismo CRS metrico que usan los indicadores
+ORIGIN = (674000.0, 5923000.0)
+METRIC_CRS = 32718
+
+AMENITY_CATEGORIES = ['education', 'health', 'supermarket', 'pharmacy', 'bus_stop']
+GREEN_AREA_CATEGORIES = ['park', 'square']
+
+
+class SyntheticCity():
+    """Road network and layers for benchmarking, in the formats the modules load.
+
+    ``kind`` is 'grid' (regular lattice) or 'random' (random geometric graph
+    joining every node to its ``k`` nearest neighbours).
+    """
+    def __init__(self, n_nodes, kind='grid', spacing=100.0, k=3, seed=0):
+        self.n_nodes = int(n_nodes)
+        self.kind = kind
+        self.spacing = spacing
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.make_network()
+        pass
+
+    def make_network(self):
+        if self.kind == 'grid':
+            self.make_grid_network()
+        elif self.kind == 'random':
+            self.make_random_network()
+        else:
+            raise ValueError(f'Unknown network kind: {self.kind}')
+
+        nodes = gpd.GeoDataFrame(
+            {'osm_id': np.arange(1, len(self.xy) + 1)},
+            geometry=gpd.points_from_xy(self.xy[:, 0], self.xy[:, 1]),
+            crs=METRIC_CRS,
+        )
+        self.bounds = nodes.total_bounds
+        nodes = nodes.to_crs(4326)
+        nodes['x'] = nodes.geometry.x
+        nodes['y'] = nodes.geometry.y
+        self.nodes = nodes
+        pass
+
+    def make_grid_network(self):
+        side = int(np.ceil(np.sqrt(self.n_nodes)))
+        ii, jj = np.meshgrid(np.arange(side), np.arange(side), indexing='ij')
+        self.xy = np.column_stack([
+            ORIGIN[0] + ii.ravel() * self.spacing,
+            ORIGIN[1] + jj.ravel() * self.spacing,
+        ])
+        ids = np.arange(side * side).reshape(side, side)
+        right = np.column_stack([ids[:-1, :].ravel(), ids[1:, :].ravel()])
+        up = np.column_stack([ids[:, :-1].ravel(), ids[:, 1:].ravel()])
+        self.set_edges(np.vstack([right, up]))
+        pass
+
+    def make_random_network(self):
+        from scipy.spatial import cKDTree
+        side = np.sqrt(self.n_nodes) * self.spacing
+        self.xy = np.column_stack([
+            ORIGIN[0] + self.rng.uniform(0, side, self.n_nodes),
+            ORIGIN[1] + self.rng.uniform(0, side, self.n_nodes),
+        ])
+        _, neighbours = cKDTree(self.xy).query(self.xy, k=self.k + 1)
+        pairs = np.column_stack([
+            np.repeat(np.arange(self.n_nodes), self.k),
+            neighbours[:, 1:].ravel(),
+        ])
+        pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+        self.set_edges(pairs)
+        pass
+
+    def set_edges(self, pairs):
+        length = np.hypot(*(self.xy[pairs[:, 0]] - self.xy[pairs[:, 1]]).T)
+        self.edges = pd.DataFrame({
+            'from': pairs[:, 0] + 1,
+            'to': pairs[:, 1] + 1,
+            'length': length,
+        })
+        pass
+
+    def make_points(self, count):
+        xmin, ymin, xmax, ymax = self.bounds
+        return gpd.points_from_xy(
+            self.rng.uniform(xmin, xmax, count),
+            self.rng.uniform(ymin, ymax, count),
+            crs=METRIC_CRS,
+        )
+
+    def amenities(self, count):
+        gdf = gpd.GeoDataFrame(
+            {
+                'name': [f'amenity_{i}' for i in range(count)],
+                'category': self.rng.choice(AMENITY_CATEGORIES, count),
+            },
+            geometry=self.make_points(count),
+        )
+        return gdf.to_crs(4326)
+
+    def green_areas(self, count, min_radius=30.0, max_radius=150.0):
+        centers = gpd.GeoSeries(self.make_points(count))
+        radius = self.rng.uniform(min_radius, max_radius, count)
+        gdf = gpd.GeoDataFrame(
+            {
+                'name': [f'green_area_{i}' for i in range(count)],
+                'category': self.rng.choice(GREEN_AREA_CATEGORIES, count),
+            },
+            geometry=centers.buffer(radius, resolution=8).values,
+            crs=METRIC_CRS,
+        )
+        return gdf.to_crs(4326)
+
+    def area_of_interest(self, fraction=1.0):
+        # Area centrada cuyo lado es una fraccion del lado total, para acotar la cantidad de origenes
+        xmin, ymin, xmax, ymax = self.bounds
+        cx, cy = (xmin + xmax) / 2, (ymin + ymax) / 2
+        half_w, half_h = (xmax - xmin) * fraction / 2, (ymax - ymin) * fraction / 2
+        gdf = gpd.GeoDataFrame(
+            {'name': ['area_of_interest']},
+            geometry=[box(cx - half_w, cy - half_h, cx + half_w, cy + half_h)],
+            crs=METRIC_CRS,
+        )
+        return gdf.to_crs(4326)
+
+    def units(self, cell_size, level, dist_type='square'):
+        xmin, ymin, xmax, ymax = self.bounds
+        xs = np.arange(xmin, xmax, cell_size)
+        ys = np.arange(ymin, ymax, cell_size)
+        xx, yy = [a.ravel() for a in np.meshgrid(xs, ys)]
+        gdf = gpd.GeoDataFrame(
+            {
+                'name': f'{dist_type}-{level}',
+                'dist_type': dist_type,
+                'code': [f'{level}_{i}' for i in range(len(xx))],
+                'level': level,
+            },
+            geometry=[box(x, y, x + cell_size, y + cell_size) for x, y in zip(xx, yy)],
+            crs=METRIC_CRS,
+        )
+        return gdf.to_crs(4326)
+
+    def save_network_h5(self, filename):
+        import pandana as pdna
+        nodes = self.nodes.set_index('osm_id')
+        net = pdna.Network(
+            nodes['x'],
+            nodes['y'],
+            self.edges['from'],
+            self.edges['to'],
+            self.edges[['length']],
+        )
+        net.nodes_df.index.name = 'osm_id'
+        net.save_hdf5(filename)
+        return filename
@@ -0,0 +1,7 @@
+#!/bin/bash
+
+# Construye la imagen base clbb-base desde la raiz del repositorio
+ROOT_DIR=$(cd "$(dirname "$0")/../.." && pwd)
+TAG=${1:-clbb-base:latest}
+
+docker build -f "$ROOT_DIR/docker/base/Dockerfile" -t "$TAG" "$ROOT_DIR"
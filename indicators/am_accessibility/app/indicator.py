@@ -0,0 +1,62 @@
+import pandas as pd
+import geopandas as gpd
+from clbb_runtime.geometry import select_nodes
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
+
+class Indicator(BaseIndicator):
+    upload_endpoint = 'upload_to_table'
+    hash_params = ('network_id', 'radii', 'decay')
+
+    @timed
+    def load_data(self):
+        self.net, self.amenities, self.area_of_interest = self.context.prefetch(
+            lambda: self.context.network(self.get_network_id()),
+            self.context.amenities,
+            self.context.area_of_interest,
+        )
+        pass
+
+    def get_radii(self):
+        return sorted({int(r) for r in self.getenv('radii', '400,800,1200').split(',')})
+
+    @timed
+    def post_amenities_to_nodes(self):
+        # La red se comparte entre etapas, por lo que las variables llevan el hash del resultado
+        self.variable_prefix = f'am_access_{self.result_hash[:12]}'
+        node_ids = self.net.get_node_ids(self.amenities.geometry.x, self.amenities.geometry.y)
+        self.categories = sorted(self.amenities['category'].unique())
+        for i, category in enumerate(self.categories):
+            mask = (self.amenities['category'] == category).values
+            self.net.set(node_ids[mask], name=f'{self.variable_prefix}_{i}')
+        pass
+
+    @timed
+    def aggregate_amenities(self):
+        # Por cada radio: cantidad de amenidades alcanzables (count) y su suma ponderada por decay (gravity)
+        radii = self.get_radii()
+        decay = self.getenv('decay', 'exp')
+        self.net.precompute(max(radii))
+
+        sources = select_nodes(self.nodes_gdf, self.area_of_interest)[['osm_id', 'geometry']]
+        df_out = []
+        for i, category in enumerate(self.categories):
+            df = sources.copy()
+            df['category'] = category
+            name = f'{self.variable_prefix}_{i}'
+            for radius in radii:
+                count = self.net.aggregate(radius, type='sum', decay='flat', name=name)
+                gravity = self.net.aggregate(radius, type='sum', decay=decay, name=name)
+                df[f'count_{radius}'] = count.reindex(df['osm_id']).fillna(0).values
+                df[f'gravity_{radius}'] = gravity.reindex(df['osm_id']).fillna(0).values
+            df_out.append(df)
+
+        self.df_out = gpd.GeoDataFrame(pd.concat(df_out, ignore_index=True), geometry='geometry', crs=4326)
+        pass
+
+    @timed
+    def calculate(self):
+        self.set_nodes_gdf()
+        self.post_amenities_to_nodes()
+        self.aggregate_amenities()
+        pass
@@ -1,145 +1,153 @@
 import numpy as np
 import pandas as pd
-import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
-import os
-import hashlib
-import json
-from glob import glob
-from shapely import wkt
-import hermes as hs
 import warnings
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
 
 warnings.filterwarnings('ignore')
-class Indicator():
-    def __init__(self):
-        self.data = None
-        self.indicator = None
-        self.keywords = []
-        
-        self.server_address = os.getenv('server_address', 'http://localhost:8000')
-        self.request_data_endpoint = os.getenv('request_data_endpoint', 'api')
-
-        self.h = hs.Handler()
-        self.h.server_address = self.server_address
-
-        self.load_env_variables()
-        self.make_hash()
-        pass
-
-    def generate_unique_code(self, strings):
-        text = ''.join(strings)
-        return hashlib.sha256(text.encode()).hexdigest()
+class Indicator(BaseIndicator):
+    upload_endpoint = 'upload_to_table'
+    hash_params = ('speed', 'indicator_to_aggregate', 'aggregation_unit', 'resolution', 'resolutions', 'sketch_bin_width', 'quantiles')
+    upstream_params = ('indicator_to_aggregate',)
 
     def load_env_variables(self):
-        def get_from_env(key):
-            return os.getenv(key, None)
-        
-        def get_dict_env(key):
-            s = get_from_env(key)
-            s = s.replace("""'""", '''"''')
-            return json.loads(s)
-        
-        def cast_to_float(val):
-            return float(val) if val is not None else None
-        
-        def get_as_float(key):
-            return cast_to_float(get_from_env(key))
-        
-        self.project_name = get_from_env('project_name')        
-        self.indicator_name = get_from_env('indicator_name')
-        self.project_status = get_dict_env('project_status')
-    
-    def make_hash(self):
-        strings = [self.project_name]
-        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
-        self.indicator_hash = self.generate_unique_code(strings)
+        super().load_env_variables()
+        # Se leen aqui porque export_indicator los usa tambien cuando el resultado viene del ResultStore
+        self.levels = self.get_levels()
+        self.dist_type = self.getenv('aggregation_unit', 'h3')
         pass
 
-    def load_data_to_aggregate(self):
-        print(self.indicator_hash)
-        indicator_to_aggregate = os.getenv('indicator_to_aggregate', None)
-        self.data = self.h.load_indicator_data(indicator_to_aggregate, self.indicator_hash)
-        self.data.set_crs(4326, inplace=True)
-        pass
-    
+    @timed
     def load_aggregation_polys(self, dist_type=None, level=None):
-        endpoint = f'{self.server_address}/api/discretedistribution/'
-        response = requests.get(endpoint)
-        data = response.json()
-        geometries = []
-        properties = []
-        for feature in data['features']:
-            geometries.append(wkt.loads(feature['geometry'].split(';')[-1]))
-            properties.append(feature['properties'])
-        gdf = gpd.GeoDataFrame(properties, geometry=geometries)
+        gdf = self.context.aggregation_units()
         mask = [True]*len(gdf)
-        level = int(os.getenv('resolution', '10'))
-        dist_type = os.getenv('aggregation_unit', 'h3')
-        if level : mask &= gdf['level']==level
-        if dist_type : mask &= gdf['dist_type']==dist_type
+        if self.levels : mask &= gdf['level'].isin(self.levels)
+        if self.dist_type : mask &= gdf['dist_type']==self.dist_type
         print('level')
-        print(level)
+        print(self.levels)
         self.unit = gdf[mask]
-        self.unit.set_crs(4326, inplace=True)
         pass
+
+    def get_levels(self):
+        # resolutions='7,8,9,10' activa el modo piramide, de lo contrario se usa resolution
+        resolutions = self.getenv('resolutions', None)
+        if resolutions:
+            return sorted({int(r) for r in resolutions.split(',')}, reverse=True)
+        return [int(self.getenv('resolution', '10'))]
+
+    def is_pyramid(self):
+        return len(self.levels) > 1
     
+    @timed
     def load_data(self):
-        self.area_of_interest = self.h.load_area_of_interest()
-        self.load_data_to_aggregate()
-        self.load_aggregation_polys() 
+        indicator_to_aggregate = self.getenv('indicator_to_aggregate', None)
+        self.area_of_interest, self.data, _ = self.context.prefetch(
+            self.context.area_of_interest,
+            lambda: self.load_indicator_data(indicator_to_aggregate),
+            self.context.aggregation_units,
+        )
+        self.data.set_crs(4326, inplace=True)
+        self.load_aggregation_polys()
         pass
 
+    @timed
     def aggregate_data(self):
         data_hex = gpd.sjoin(self.data, self.unit[['code', 'geometry']])
-        data_hex_group = data_hex[['code', 'category', 'path_length']].groupby(['code', 'category']).agg('mean').reset_index()
+        data_hex_group = data_hex[['code', 'category', 'path_length']].groupby(['code', 'category'], observed=True).agg('mean').reset_index()
         data_hex_geo = pd.merge(data_hex_group, self.unit[['code', 'geometry']], on='code')
         self.df_out = gpd.GeoDataFrame(data_hex_geo, geometry='geometry')
         pass
 
+    def get_parent_codes(self, codes, level):
+        if self.dist_type == 'h3':
+            from h3 import h3
+            return pd.Series({code: h3.h3_to_parent(code, level) for code in codes})
+        # Para unidades que no son h3 se asigna el padre por contencion del punto representativo
+        children = self.unit[self.unit['code'].isin(codes)][['code', 'geometry']].copy()
+        children['geometry'] = children.representative_point()
+        parents = self.unit[self.unit['level']==level][['code', 'geometry']]
+        matched = gpd.sjoin(children, parents, predicate='within', lsuffix='child', rsuffix='parent')
+        return matched.drop_duplicates('code_child').set_index('code_child')['code_parent']
+
+    def make_stats_and_sketch(self, data_hex):
+        # Estadisticos sumables (suma, conteo) y un histograma de ancho fijo como sketch de cuantiles.
+        # Ambos se pueden combinar sumando, por lo que los niveles gruesos no requieren volver al dato original.
+        self.bin_width = float(self.getenv('sketch_bin_width', 25))
+        data_hex = data_hex[['code', 'category', 'path_length']].dropna(subset=['path_length']).copy()
+        data_hex['bin'] = np.floor(data_hex['path_length'] / self.bin_width).astype(int)
+
+        stats = data_hex.groupby(['code', 'category'], observed=True)['path_length'].agg(['sum', 'count']).reset_index()
+        sketch = data_hex.groupby(['code', 'category', 'bin'], observed=True).size().rename('count').reset_index()
+        return stats, sketch
+
+    def roll_up(self, stats, sketch, level):
+        parents = self.get_parent_codes(stats['code'].unique(), level)
+        stats = stats.assign(code=stats['code'].map(parents)).dropna(subset=['code'])
+        sketch = sketch.assign(code=sketch['code'].map(parents)).dropna(subset=['code'])
+        stats = stats.groupby(['code', 'category'], observed=True)[['sum', 'count']].sum().reset_index()
+        sketch = sketch.groupby(['code', 'category', 'bin'], observed=True)['count'].sum().reset_index()
+        return stats, sketch
+
+    def summarize_level(self, stats, sketch, level):
+        quantiles = [float(q) for q in self.getenv('quantiles', '0.5,0.9').split(',')]
+        out = stats.copy()
+        out['path_length'] = out['sum'] / out['count']
+
+        sketch = sketch.sort_values(['code', 'category', 'bin'])
+        sketch['cum'] = sketch.groupby(['code', 'category'], observed=True)['count'].cumsum()
+        sketch = pd.merge(sketch, stats[['code', 'category', 'count']].rename(columns={'count': 'total'}), on=['code', 'category'])
+        for q in quantiles:
+            col = f'p{int(round(q*100))}'
+            reached = sketch[sketch['cum'] >= q * sketch['total']]
+            first_bin = reached.groupby(['code', 'category'], observed=True)['bin'].min().rename(col).reset_index()
+            first_bin[col] = (first_bin[col] + 0.5) * self.bin_width
+            out = pd.merge(out, first_bin, on=['code', 'category'], how='left')
+
+        out['level'] = level
+        out = out.drop(columns=['sum'])
+        out = pd.merge(out, self.unit[self.unit['level']==level][['code', 'geometry']], on='code')
+        return out
+
+    @timed
+    def aggregate_pyramid(self):
+        finest = self.levels[0]
+        data_hex = gpd.sjoin(self.data, self.unit[self.unit['level']==finest][['code', 'geometry']])
+        stats, sketch = self.make_stats_and_sketch(data_hex)
+
+        df_out = [self.summarize_level(stats, sketch, finest)]
+        for level in self.levels[1:]:
+            stats, sketch = self.roll_up(stats, sketch, level)
+            df_out.append(self.summarize_level(stats, sketch, level))
+
+        self.df_out = gpd.GeoDataFrame(pd.concat(df_out, ignore_index=True), geometry='geometry', crs=4326)
+        pass
+
+    @timed
     def filter_data(self):
         self.df_out = gpd.overlay(self.df_out, self.area_of_interest)
         pass
 
-    def add_travel_time(self):
-        self.speed = float(os.getenv('speed', 4.5))
-
-        speed_m_per_min = self.speed * 1000 / 60
-        
-        self.df_out['travel_time'] = self.df_out['path_length'] / speed_m_per_min
-        pass
-    
+    @timed
     def calculate(self):
-        self.aggregate_data()
+        if self.is_pyramid():
+            self.aggregate_pyramid()
+        else:
+            self.aggregate_data()
         self.filter_data()
         self.add_travel_time()
         pass
-    
-    def export_indicator(self):
-        endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
-        # endpoint = f'{self.server_address}/urban-indicators/indicatordata/update_indicator/'
-
-        data = {
-            'indicator_name': self.indicator_name,
-            'indicator_hash': self.indicator_hash,
-            'is_geo': True,
-            'json_data': self.df_out.to_json(),
-        }
-
-        json_data = json.dumps(data)
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
-        if response.status_code == 200:
-            print('Data saved successfully')
-        else:
-            print('Error saving data:', response.text)
-        pass
 
-    def exec(self):
-        self.load_data()
-        self.calculate()
-        self.export_indicator()
+    @timed
+    def export_pyramid(self):
+        # Un indicador por nivel, con el mismo sufijo que usa separate_am_prox para categorias
+        self.export_results([(f'{self.indicator_name}_{level}', df_level) for level, df_level in self.df_out.groupby('level')])
         pass
 
+    @timed
+    def export_indicator(self):
+        if self.is_pyramid():
+            self.export_pyramid()
+        else:
+            self.export_result(self.indicator_name, self.df_out)
+        pass
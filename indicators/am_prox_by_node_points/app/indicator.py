@@ -1,99 +1,50 @@
+import hashlib
 import numpy as np
 import pandas as pd
-import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
-import os
-import hashlib
-import json
-from glob import glob
-from shapely import wkt
-import hermes as hs
-
-def generate_unique_code(strings):
-    text = ''.join(strings)
-    return hashlib.sha256(text.encode()).hexdigest()
-
-class Indicator():
-    def __init__(self):
-        self.data = None
-        self.indicator = None
-        self.keywords = []
-        
-        self.server_address = os.getenv('server_address', 'http://localhost:8000')
-
-        self.h = hs.Handler()
-        self.h.server_address = self.server_address
-
-        self.load_env_variables()
-        self.make_hash()
-        pass
+from clbb_runtime.frames import compact_paths, mark_unreachable, nearest_per_group
+from clbb_runtime.geometry import select_nodes
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
 
-    def load_env_variables(self):
-        def get_from_env(key):
-            return os.getenv(key, None)
-        
-        def get_dict_env(key):
-            s = get_from_env(key)
-            s = s.replace("""'""", '''"''')
-            return json.loads(s)
-        
-        def cast_to_float(val):
-            return float(val) if val is not None else None
-        
-        def get_as_float(key):
-            return cast_to_float(get_from_env(key))
-        
-        self.project_name = get_from_env('project_name')        
-        self.indicator_name = get_from_env('indicator_name')
-        self.project_status = get_dict_env('project_status')
-        pass
-
-    def generate_unique_code(self, strings):
-        text = ''.join(strings)
-        return hashlib.sha256(text.encode()).hexdigest()
-    
-    def make_hash(self):
-        strings = [self.project_name]
-        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
-        self.indicator_hash = self.generate_unique_code(strings)
-        pass
+class Indicator(BaseIndicator):
+    upload_endpoint = 'upload_to_table'
+    hash_params = ('network_id', 'speed', 'method', 'k', 'max_distance', 'unreachable')
 
+    @timed
     def load_network(self):
-        id_network = int(os.getenv('network_id', None))
-        self.net = self.h.load_network(id_network=id_network)
+        self.net = self.context.network(self.get_network_id())
         pass
 
+    @timed
     def load_amenities(self):
-        self.amenities = self.h.load_amenities()
+        self.amenities = self.context.amenities().copy()
         pass
 
+    @timed
     def load_area_of_interest(self):
-        self.area_of_interest = self.h.load_area_of_interest()
+        self.area_of_interest = self.context.area_of_interest()
         pass
 
+    @timed
     def load_data(self):
+        self.context.prefetch(lambda: self.context.network(self.get_network_id()), self.context.amenities, self.context.area_of_interest)
         self.load_network()
         self.load_amenities()
         self.load_area_of_interest()
         pass
-    
-    def set_nodes_gdf(self):
-        from shapely.geometry import Point
-        df = self.net.nodes_df
-        geometry = [Point(xy) for xy in zip(df['x'], df['y'])]
-        self.nodes_gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        self.nodes_gdf.reset_index(inplace=True)
-        self.nodes_gdf = self.nodes_gdf.set_crs(4326)
-        pass
 
-    def calculate_distances_from_sources(self):
-        self.amenities['node_id'] = self.net.get_node_ids(self.amenities['geometry'].x, self.amenities['geometry'].y)
-        sources = gpd.overlay(self.nodes_gdf, self.area_of_interest)
-        sources = sources[['osm_id', 'x', 'y', 'geometry']]
-
-        nodes_destination = list(set(self.amenities['node_id']))
+    def paths_key(self, sources, category, nodes_destination):
+        # Identifica un calculo parcial: red, origenes y destinos de una categoria
+        digest = hashlib.sha256()
+        digest.update(str(self.get_network_id()).encode())
+        digest.update(str(category).encode())
+        digest.update(np.asarray(sources['osm_id'], dtype=np.int64).tobytes())
+        digest.update(np.asarray(nodes_destination, dtype=np.int64).tobytes())
+        return ('am_prox_paths', digest.hexdigest())
+
+    def shortest_paths_by_category(self, sources, destinations):
+        nodes_destination = list(set(destinations['node_id']))
         count_nodes = len(nodes_destination)
         df_out = []
         for _, row in sources.iterrows():
@@ -106,61 +57,90 @@ class Indicator():
             tmp = pd.DataFrame(
                 data={
                 'node_id': nodes_destination,
-                'path_length': path_lenghts
+                'path_length': mark_unreachable(path_lenghts)
                 }
             )
             
-            df_paths = pd.merge(self.amenities, tmp, on='node_id')
+            # Un solo destino por categoria: el mas cercano, con empates resueltos por id de nodo
+            df_paths = pd.merge(destinations, tmp, on='node_id')
             df_paths = df_paths[['category', 'node_id', 'path_length']]
-            df_paths.drop_duplicates(inplace=True)
-            df__mins = df_paths[['category', 'path_length']].groupby(by=['category']).agg('min').reset_index()
-            df_paths = pd.merge(df__mins, df_paths, on=['category', 'path_length'])
             df_paths.rename(columns={'node_id': 'destination'}, inplace=True)
+            df_paths = nearest_per_group(df_paths, 'category')
             df_paths['source'] = row['osm_id']
             df_out.append(df_paths)
+        return pd.concat(df_out).reset_index(drop=True)
 
-        self.df_out = pd.concat(df_out).reset_index(drop=True)
-        self.df_out = pd.merge(self.df_out.rename(columns={'source':'osm_id'}), self.nodes_gdf[['osm_id','geometry']])
-        self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
-        pass
+    def pairwise_distances(self, sources):
+        destinations = self.amenities[['category', 'node_id']].drop_duplicates()
+        keys = {
+            category: self.paths_key(sources, category, np.sort(group['node_id'].unique()))
+            for category, group in destinations.groupby('category', observed=True)
+        }
 
-    def add_travel_time(self):
-        self.speed = float(os.getenv('speed', 4.5))
+        # Solo se calculan las categorias cuyos destinos no se han calculado antes (p.ej. en otro escenario)
+        missing = [category for category, key in keys.items() if not self.context.has_computed(key)]
+        if missing:
+            computed = self.shortest_paths_by_category(sources, destinations[destinations['category'].isin(missing)])
+            for category in missing:
+                self.context.memoize(keys[category], lambda: computed[computed['category']==category])
+        print(f'Categorias calculadas: {len(missing)} de {len(keys)}')
+
+        return pd.concat([self.context.memoize(key, None) for key in keys.values()]).reset_index(drop=True)
+
+    def get_max_distance(self):
+        max_distance = self.getenv('max_distance', None)
+        if max_distance is not None:
+            return float(max_distance)
+        # Sin max_distance no se descarta ninguna amenidad: ningun camino supera la suma de todos los tramos de la red
+        return float(self.net.edges_df[self.net.impedance_names[0]].sum()) + 1
+
+    def nearest_pois_by_category(self, sources):
+        # Las k amenidades mas cercanas de cada categoria para todos los nodos en una consulta de pandana
+        k = int(self.getenv('k', 1))
+        max_distance = self.get_max_distance()
+        prefix = f'am_prox_{self.result_hash[:12]}'
 
-        speed_m_per_min = self.speed * 1000 / 60
-        
-        self.df_out['travel_time'] = self.df_out['path_length'] / speed_m_per_min
+        df_out = []
+        for i, (category, group) in enumerate(self.amenities.groupby('category', observed=True)):
+            name = f'{prefix}_{i}'
+            self.net.set_pois(category=name, maxdist=max_distance, maxitems=k, x_col=group.geometry.x, y_col=group.geometry.y)
+            nearest = self.net.nearest_pois(max_distance, name, num_pois=k, include_poi_ids=True)
+            nearest = nearest.reindex(sources['osm_id'].values)
+            for rank in range(1, k + 1):
+                df_rank = pd.DataFrame({
+                    'source': nearest.index.values,
+                    'rank': rank,
+                    'path_length': nearest[rank].values,
+                    'poi': nearest[f'poi{rank}'].values,
+                })
+                # pandana devuelve max_distance cuando no hay una amenidad alcanzable en ese rango
+                df_rank = df_rank[(df_rank['path_length'] < max_distance) & df_rank['poi'].notna()]
+                df_rank['destination'] = group['node_id'].reindex(df_rank['poi'].astype(group.index.dtype)).values
+                df_rank['category'] = category
+                df_out.append(df_rank.drop(columns='poi'))
+        return pd.concat(df_out).reset_index(drop=True)
+
+    @timed
+    def calculate_distances_from_sources(self):
+        self.amenities['node_id'] = self.net.get_node_ids(self.amenities['geometry'].x, self.amenities['geometry'].y)
+        sources = select_nodes(self.nodes_gdf, self.area_of_interest)
+        sources = sources[['osm_id', 'x', 'y', 'geometry']]
+
+        # method=nearest_pois calcula solo las k amenidades mas cercanas; pairwise (por defecto) todas las distancias origen-destino
+        if self.getenv('method', 'pairwise') == 'nearest_pois':
+            self.df_out = self.nearest_pois_by_category(sources)
+        else:
+            self.df_out = self.pairwise_distances(sources)
+        # unreachable=keep deja una fila sin destino para los pares sin camino
+        self.df_out = compact_paths(self.df_out, unreachable=self.getenv('unreachable', 'drop'))
+
+        self.df_out = pd.merge(self.df_out.rename(columns={'source':'osm_id'}), self.nodes_gdf[['osm_id','geometry']])
+        self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
         pass
     
+    @timed
     def calculate(self):
         self.set_nodes_gdf()
         self.calculate_distances_from_sources()
         self.add_travel_time()
         pass
-    
-    def export_indicator(self):
-        endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
-        # endpoint = f'{self.server_address}/urban-indicators/indicatordata/update_indicator/'
-
-        data = {
-            'indicator_name': self.indicator_name,
-            'indicator_hash': self.indicator_hash,
-            'is_geo': True,
-            'json_data': self.df_out.to_json(),
-        }
-
-        json_data = json.dumps(data)
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
-        if response.status_code == 200:
-            print('Data saved successfully')
-        else:
-            print('Error saving data:', response.text)
-        pass
-
-    def exec(self):
-        self.load_data()
-        self.calculate()
-        self.export_indicator()
-        pass
-
@@ -1,137 +1,136 @@
-import numpy as np
+import os
 import pandas as pd
-import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
-import os
-import hashlib
-import json
-from glob import glob
-from shapely import wkt
-import hermes as hs
-
-class Indicator():
-    def __init__(self):
-        self.data = None
-        self.indicator = None
-        self.keywords = []
-        
-        self.server_address = os.getenv('server_address', 'http://localhost:8000')
-        self.request_data_endpoint = os.getenv('request_data_endpoint', 'api')
-
-        self.h = hs.Handler()
-        self.h.server_address = self.server_address
-
-        self.load_env_variables()
-        self.make_hash()
-        pass
-
-    def generate_unique_code(self, strings):
-        text = ''.join(strings)
-        return hashlib.sha256(text.encode()).hexdigest()
+from clbb_runtime.frames import apply_dtype_policy
+from clbb_runtime.geometry import snap_to_nodes
+from clbb_runtime.grid import grid_origin, make_tiles, mesh_points, run_tiles, tile_mesh_points, to_metric
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.raster import GridSurface, check_format
+
+class Indicator(BaseIndicator):
+    hash_params = ('network_id', 'speed', 'x_spacing', 'y_spacing', 'rank', 'tile_kind', 'tile_size', 'output_format', 'raster_format')
+    upstream = ('am_prox_by_node_points',)
+    surface = None
 
     def load_env_variables(self):
-        def get_from_env(key):
-            return os.getenv(key, None)
-        
-        def get_dict_env(key):
-            s = get_from_env(key)
-            s = s.replace("""'""", '''"''')
-            return json.loads(s)
-        
-        def cast_to_float(val):
-            return float(val) if val is not None else None
-        
-        def get_as_float(key):
-            return cast_to_float(get_from_env(key))
-        
-        self.project_name = get_from_env('project_name')        
-        self.indicator_name = get_from_env('indicator_name')
-        self.project_status = get_dict_env('project_status')
-    
-    def make_hash(self):
-        strings = [self.project_name]
-        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
-        self.indicator_hash = self.generate_unique_code(strings)
+        super().load_env_variables()
+        # output_format: vector (puntos), raster (superficie por categoria) o both
+        self.output_format = self.getenv('output_format', 'vector')
+        self.raster_format = self.getenv('raster_format', 'tif')
+        if self.output_format in ('raster', 'both'):
+            # Sin rasterio un GeoTIFF pedido falla aqui, antes de calcular, en vez de cambiar de formato
+            check_format(self.raster_format)
+        if self.output_format == 'raster':
+            # El frame de puntos sigue en el contexto para las etapas siguientes, pero no se sube
+            self.upload = False
         pass
 
-    def load_distances_paths(self):
-        print(self.indicator_hash)
-        return self.h.load_indicator_data('am_prox_by_node_points', self.indicator_hash)
-
+    @timed
     def load_data(self):
-        self.net = self.h.load_network()
-        self.amenities = self.h.load_amenities()
-        self.area_of_interest = self.h.load_area_of_interest()
-        self.paths = self.load_distances_paths()
-        pass
-    
-    def set_nodes_gdf(self):
-        from shapely.geometry import Point
-        df = self.net.nodes_df
-        geometry = [Point(xy) for xy in zip(df['x'], df['y'])]
-        self.nodes_gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        self.nodes_gdf.reset_index(inplace=True)
-        self.nodes_gdf = self.nodes_gdf.set_crs(4326)
+        self.net, self.amenities, self.area_of_interest, self.paths = self.context.prefetch(
+            lambda: self.context.network(self.get_network_id()),
+            self.context.amenities,
+            self.context.area_of_interest,
+            lambda: self.load_indicator_data('am_prox_by_node_points'),
+        )
         pass
 
+    def get_spacing(self):
+        return int(self.getenv('x_spacing')), int(self.getenv('y_spacing'))
+
+    @timed
     def make_mesh_points(self):
-        poly = self.area_of_interest.copy()
-        poly.to_crs(32718, inplace=True)
+        x_spacing, y_spacing = self.get_spacing()
+        self.mesh_points = mesh_points(self.area_of_interest, x_spacing, y_spacing)
+        pass
 
-        x_spacing = int(os.getenv('x_spacing'))
-        y_spacing = int(os.getenv('y_spacing'))
+    @timed
+    def select_paths(self):
+        paths = self.paths
+        if 'rank' in paths.columns:
+            # Con k > 1 en am_prox_by_node_points, rank elige la amenidad (1 = la mas cercana, 2 = la segunda, ...)
+            paths = paths[paths['rank'] == int(self.getenv('rank', 1))]
+        self.selected_paths = paths[['osm_id', 'path_length', 'category', 'destination']]
+        pass
 
-        xmin, ymin, xmax, ymax = poly.total_bounds #Find the bounds of all polygons in the poly
-        xcoords = [c for c in np.arange(xmin, xmax, x_spacing)] #Create x coordinates
-        ycoords = [c for c in np.arange(ymin, ymax, y_spacing)] #And y
+    def points_with_paths(self, points):
+        points['osm_id'], _ = snap_to_nodes(self.nodes_gdf, points.geometry)
+        df = pd.merge(points, self.selected_paths, on='osm_id')
+        df = gpd.GeoDataFrame(data=df.drop(columns=['geometry']), geometry=df['geometry'], crs=points.crs)
+        return apply_dtype_policy(df)
 
-        coordinate_pairs = np.array(np.meshgrid(xcoords, ycoords)).T.reshape(-1, 2) #Create all combinations of xy coordinates
-        geometries = gpd.points_from_xy(coordinate_pairs[:,0], coordinate_pairs[:,1]) #Create a list of shapely points
+    @timed
+    def assign_node_to_points(self):
+        self.df_out = self.finish_points(self.points_with_paths(self.mesh_points))
+        pass
 
-        pointpoly = gpd.GeoDataFrame(geometry=geometries, crs=poly.crs)
-        pointpoly = pointpoly.to_crs(4326)
-        self.mesh_points = pointpoly.copy()
-        self.mesh_points = gpd.overlay(self.mesh_points, self.area_of_interest)
-        self.mesh_points.drop(columns='name', inplace=True)
+    @timed
+    def calculate_tiles(self):
+        # Cada tile se calcula y exporta por separado, asi la memoria no depende del tamano del area de interes
+        x_spacing, y_spacing = self.get_spacing()
+        kind = self.getenv('tile_kind', 'square')
+        # El area se proyecta una sola vez; su indice y el de nodos se construyen antes de repartir los tiles entre hilos
+        area = to_metric(self.area_of_interest)
+        area.sindex
+        self.nodes_gdf.sindex
+        tiles = make_tiles(area, kind=kind, size=float(self.getenv('tile_size')))
+        origin = grid_origin(area)
+
+        def process(tile):
+            points = tile_mesh_points(area, tile, x_spacing, y_spacing, origin, kind=kind)
+            return self.points_with_paths(points)
+
+        self.context.discard_result(self.indicator_name, self.indicator_hash)
+        first = True
+        for tile, df_tile in run_tiles(tiles, process, workers=int(self.getenv('tile_workers', 1))):
+            if len(df_tile):
+                # El primer tile reemplaza el resultado de una corrida anterior; los siguientes se agregan
+                self.export_results([(self.indicator_name, self.finish_points(df_tile))], append=True, first=first)
+                first = False
+        self.df_out = None
         pass
 
-    def assign_node_to_points(self):
-        self.mesh_points['osm_id'] = self.net.get_node_ids(self.mesh_points['geometry'].x, self.mesh_points['geometry'].y)
-        self.df_out = pd.merge(self.mesh_points, self.paths[['osm_id','path_length', 'category', 'destination']], on='osm_id')
-        self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
+    @timed
+    def make_surface(self):
+        if self.output_format in ('raster', 'both'):
+            x_spacing, y_spacing = self.get_spacing()
+            # Por tiles las bandas se escriben en disco ventana a ventana, sin tenerlas completas en memoria
+            scratch = os.path.join(self.raster_directory(), '.bands') if self.getenv('tile_size', None) else None
+            self.surface = GridSurface(self.area_of_interest, x_spacing, y_spacing, directory=scratch)
         pass
-    
+
+    def finish_points(self, df):
+        # col y row solo ubican cada punto en la superficie raster
+        if self.surface is not None:
+            self.surface.add(df)
+        return df.drop(columns=['col', 'row'])
+
+    @timed
     def calculate(self):
         self.set_nodes_gdf()
+        self.make_surface()
+        self.select_paths()
+        if self.getenv('tile_size', None):
+            self.calculate_tiles()
+            return
         self.make_mesh_points()
         self.assign_node_to_points()
         pass
-    
-    def export_indicator(self):
-        # endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
-        endpoint = f'{self.server_address}/urban-indicators/indicatordata/update_indicator/'
-
-        data = {
-            'indicator_name': self.indicator_name,
-            'indicator_hash': self.indicator_hash,
-            'is_geo': True,
-            'json_data': self.df_out.to_json(),
-        }
-
-        json_data = json.dumps(data)
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
-        if response.status_code == 200:
-            print('Data saved successfully')
-        else:
-            print('Error saving data:', response.text)
-        pass
 
-    def exec(self):
-        self.load_data()
-        self.calculate()
-        self.export_indicator()
+    def raster_directory(self):
+        return os.path.join(self.getenv('raster_path', '/app/tmp/rasters'), self.indicator_name, self.result_hash[:12])
+
+    @timed
+    def write_rasters(self):
+        directory = self.raster_directory()
+        paths = self.surface.write(directory, self.raster_format)
+        # Los rasters quedan en disco local: el backend solo recibe GeoJSON
+        print(f'{len(paths)} rasters written to {directory} (local only, not uploaded)')
         pass
 
+    def export_indicator(self):
+        if self.surface is not None:
+            self.write_rasters()
+        super().export_indicator()
+        pass
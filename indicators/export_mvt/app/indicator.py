@@ -0,0 +1,46 @@
+import os
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.mvt import write_pyramid
+
+class Indicator(BaseIndicator):
+    upstream_params = ('indicator_to_export',)
+
+    @timed
+    def load_data(self):
+        self.indicator_to_export = self.getenv('indicator_to_export', None)
+        self.data = self.load_indicator_data(self.indicator_to_export)
+        self.data.set_crs(4326, inplace=True, allow_override=True)
+        pass
+
+    def get_attributes(self):
+        # Atributos que se mantienen bajo full_attributes_zoom; vacio mantiene todos
+        attributes = self.getenv('attributes', '')
+        return [col.strip() for col in attributes.split(',') if col.strip()] or None
+
+    @timed
+    def write_tiles(self):
+        # mvt_path terminado en .mbtiles escribe un archivo MBTiles, si no un directorio z/x/y.pbf
+        default_path = os.path.join('/app/tmp/tiles', f'{self.indicator_to_export}_{self.indicator_hash}.mbtiles')
+        self.mvt_path = self.getenv('mvt_path', default_path)
+        maxzoom = int(self.getenv('maxzoom', 16))
+        full_attributes_zoom = self.getenv('full_attributes_zoom', None)
+        count = write_pyramid(
+            self.data,
+            self.mvt_path,
+            self.getenv('layer_name', self.indicator_to_export),
+            minzoom=int(self.getenv('minzoom', 10)),
+            maxzoom=maxzoom,
+            attributes=self.get_attributes(),
+            full_attributes_zoom=int(full_attributes_zoom) if full_attributes_zoom else maxzoom,
+            simplify_px=float(self.getenv('simplify_px', 1)),
+            thin_px=float(self.getenv('thin_px', 4)),
+        )
+        print(f'{count} tiles written to {self.mvt_path}')
+        pass
+
+    @timed
+    def exec(self):
+        self.load_data()
+        self.write_tiles()
+        pass
@@ -1,128 +1,66 @@
-import numpy as np
 import pandas as pd
-import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
-import os
-import hashlib
-import json
-from glob import glob
-from shapely import wkt
-import hermes as hs
+from clbb_runtime.frames import apply_dtype_policy, compact_paths, mark_unreachable, nearest_per_group
+from clbb_runtime.geometry import nodes_within, select_nodes, boundary_access_points
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
 
-class Indicator():
-    def __init__(self):
-        self.data = None
-        self.indicator = None
-        self.keywords = []
-        
-        self.server_address = os.getenv('server_address', 'http://192.168.31.120:8001')
-
-        self.h = hs.Handler()
-        self.h.server_address = self.server_address
-
-        self.load_env_variables()
-        self.make_hash()
-        pass
-
-    def generate_unique_code(self, strings):
-        text = ''.join(strings)
-        return hashlib.sha256(text.encode()).hexdigest()
-    
-    def load_env_variables(self):
-        def get_from_env(key):
-            return os.getenv(key, None)
-        
-        def get_dict_env(key):
-            s = get_from_env(key)
-            s = s.replace("""'""", '''"''')
-            return json.loads(s)
-        
-        def cast_to_float(val):
-            return float(val) if val is not None else None
-        
-        def get_as_float(key):
-            return cast_to_float(get_from_env(key))
-        
-        self.project_name = get_from_env('project_name')        
-        self.indicator_name = get_from_env('indicator_name')
-        self.project_status = get_dict_env('project_status')
-        pass
-            
-    def make_hash(self):
-        strings = [self.project_name]
-        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
-        self.indicator_hash = self.generate_unique_code(strings)
-        pass
+class Indicator(BaseIndicator):
+    hash_params = ('network_id', 'speed', 'access_point_spacing', 'unreachable')
 
+    @timed
     def load_network(self):
-        id_network = int(os.getenv('network_id', None))
-        self.net = self.h.load_network(id_network=id_network)
+        self.net = self.context.network(self.get_network_id())
         pass
 
+    @timed
     def load_green_areas(self):
-        # endpoint = f'{self.server_address}/api/greenarea/'
-        # response = requests.get(endpoint)
-        # data = response.json()
-        # geometries = []
-        # properties = []
-        # for feature in data['features']:
-        #     geometries.append(wkt.loads(feature['geometry'].split(';')[-1]))
-        #     properties.append(feature['properties'])
-        # self.green_areas = gpd.GeoDataFrame(properties, geometry=geometries)
-        # self.green_areas.set_crs(4326, inplace=True)
-        self.green_areas = self.h.load_green_areas()
+        self.green_areas = self.context.green_areas()
         pass
 
+    @timed
     def load_area_of_interest(self):
-        self.area_of_interest = self.h.load_area_of_interest()
+        self.area_of_interest = self.context.area_of_interest()
         pass
 
+    @timed
     def load_data(self):
+        self.context.prefetch(lambda: self.context.network(self.get_network_id()), self.context.green_areas, self.context.area_of_interest)
         self.load_network()
         self.load_green_areas()
         self.load_area_of_interest()
         pass
     
-    def set_nodes_gdf(self):
-        from shapely.geometry import Point
-        df = self.net.nodes_df
-        geometry = [Point(xy) for xy in zip(df['x'], df['y'])]
-        self.nodes_gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        self.nodes_gdf.reset_index(inplace=True)
-        self.nodes_gdf = self.nodes_gdf.set_crs(4326)
-        pass
-    
+    @timed
     def assign_nodes_to_green_area(self):
-        ga_node_set = []
-        for _, row in self.green_areas.iterrows():
-            geom = row['geometry']
-            contour = list(geom.exterior.coords)
-            points = pd.DataFrame(contour, columns=['x', 'y'])
-            points['name'] = row['name']
-            points['category'] = row['category']
-            points['node_id'] = self.net.get_node_ids(points['x'], points['y'])
-            ga_node_set.append(points)
-        self.ga_node_set = pd.concat(ga_node_set)
+        # Puntos de acceso cada access_point_spacing metros sobre todos los anillos (multipartes y huecos incluidos)
+        spacing = float(self.getenv('access_point_spacing', 25))
+        points = boundary_access_points(self.green_areas, spacing, columns=['name', 'category'])
+        points['x'] = points.geometry.x
+        points['y'] = points.geometry.y
+        points['node_id'] = self.net.get_node_ids(points['x'], points['y']).values
+        self.ga_node_set = apply_dtype_policy(pd.DataFrame(points.drop(columns='geometry')))
         self.ga_node_set.drop_duplicates(subset=['category', 'node_id'], inplace=True)
         self.ga_node_set.reset_index(inplace=True, drop=True)
         pass
 
+    @timed
     def get_nodes_inside_greenareas(self):
-        nodes_inside_greenareas = gpd.overlay(self.nodes_gdf, self.green_areas)
+        nodes_inside_greenareas = nodes_within(self.nodes_gdf, self.green_areas, columns=['category', 'name'])
+        nodes_inside_greenareas['geometry'] = self.nodes_gdf.geometry.values[nodes_inside_greenareas['node_idx'].values]
         cols = ['category', 'path_length', 'destination', 'osm_id', 'geometry']
         nodes_inside_greenareas['path_length'] = 0
         nodes_inside_greenareas['destination'] = nodes_inside_greenareas['osm_id']
-        self.nodes_inside_greenareas = nodes_inside_greenareas[cols]
+        self.nodes_inside_greenareas = nodes_inside_greenareas[cols].drop_duplicates(subset=['osm_id', 'category'])
         pass
 
     def get_sources_nodes(self):
-        sources = gpd.overlay(self.nodes_gdf, self.area_of_interest)
+        sources = select_nodes(self.nodes_gdf, self.area_of_interest)
         sources = sources[['osm_id', 'x', 'y', 'geometry']]
         sources = sources[~sources['osm_id'].isin(self.nodes_inside_greenareas['osm_id'])]
         return sources
 
+    @timed
     def calculate_distances_from_sources(self):
         sources = self.get_sources_nodes()
 
@@ -139,36 +77,31 @@ class Indicator():
             tmp = pd.DataFrame(
                 data={
                 'node_id': nodes_destination,
-                'path_length': path_lenghts
+                'path_length': mark_unreachable(path_lenghts)
                 }
             )
             
+            # Un solo destino por categoria: el mas cercano, con empates resueltos por id de nodo
             df_paths = pd.merge(self.ga_node_set, tmp, on='node_id')
             df_paths = df_paths[['category', 'node_id', 'path_length']]
-            df_paths.drop_duplicates(inplace=True)
-            df__mins = df_paths[['category', 'path_length']].groupby(by=['category']).agg('min').reset_index()
-            df_paths = pd.merge(df__mins, df_paths, on=['category', 'path_length'])
             df_paths.rename(columns={'node_id': 'destination'}, inplace=True)
+            df_paths = nearest_per_group(df_paths, 'category')
             df_paths['source'] = row['osm_id']
             df_out.append(df_paths)
 
-        self.df_out = pd.concat(df_out).reset_index(drop=True)
+        # unreachable=keep deja una fila sin destino para los pares sin camino
+        self.df_out = compact_paths(pd.concat(df_out), unreachable=self.getenv('unreachable', 'drop'))
         self.df_out = pd.merge(self.df_out.rename(columns={'source':'osm_id'}), self.nodes_gdf[['osm_id','geometry']])
         pass
 
+    @timed
     def concat_results(self):
-        self.df_out = pd.concat([self.df_out, self.nodes_inside_greenareas])
+        self.df_out = pd.concat([self.df_out, self.nodes_inside_greenareas], ignore_index=True)
+        self.df_out = self.df_out.astype({'category': 'category', 'path_length': 'float32'})
         self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
         pass
     
-    def add_travel_time(self):
-        self.speed = float(os.getenv('speed', 4.5))
-
-        speed_m_per_min = self.speed * 1000 / 60
-        
-        self.df_out['travel_time'] = self.df_out['path_length'] / speed_m_per_min
-        pass
-
+    @timed
     def calculate(self):
         self.set_nodes_gdf()
         self.assign_nodes_to_green_area()
@@ -177,29 +110,3 @@ class Indicator():
         self.concat_results()
         self.add_travel_time()
         pass
-    
-    def export_indicator(self):
-        # endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
-        endpoint = f'{self.server_address}/urban-indicators/indicatordata/update_indicator/'
-
-        data = {
-            'indicator_name': self.indicator_name,
-            'indicator_hash': self.indicator_hash,
-            'is_geo': True,
-            'json_data': self.df_out.to_json(),
-        }
-
-        json_data = json.dumps(data)
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
-        if response.status_code == 200:
-            print('Data saved successfully')
-        else:
-            print('Error saving data:', response.text)
-        pass
-
-    def exec(self):
-        self.load_data()
-        self.calculate()
-        self.export_indicator()
-        pass
\ No newline at end of file
@@ -1,143 +1,79 @@
-import numpy as np
+import os
 import pandas as pd
-import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
-import os
-import hashlib
-import json
-from glob import glob
-from shapely import wkt
-import hermes as hs
-
-class Indicator():
-    def __init__(self):
-        self.data = None
-        self.indicator = None
-        self.keywords = []
-        
-        self.server_address = os.getenv('server_address', 'http://localhost:8000')
-        self.request_data_endpoint = os.getenv('request_data_endpoint', 'api')
-        self.id_network = os.getenv('id_roadnetwork', 1)
-        self.id_project = os.getenv('id_project', 1)
-
-        self.h = hs.Handler()
-        self.h.server_address = self.server_address
-
-        self.load_env_variables()
-        self.make_hash()
-        pass
-
-    def generate_unique_code(self, strings):
-        text = ''.join(strings)
-        return hashlib.sha256(text.encode()).hexdigest()
+from clbb_runtime.frames import apply_dtype_policy
+from clbb_runtime.geometry import snap_to_nodes
+from clbb_runtime.grid import grid_origin, make_tiles, mesh_points, run_tiles, tile_mesh_points, to_metric
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.raster import GridSurface, check_format
+
+class Indicator(BaseIndicator):
+    hash_params = ('network_id', 'speed', 'x_spacing', 'y_spacing', 'tile_kind', 'tile_size', 'output_format', 'raster_format')
+    upstream = ('ga_prox_by_node_points',)
+    surface = None
 
     def load_env_variables(self):
-        def get_from_env(key):
-            return os.getenv(key, None)
-        
-        def get_dict_env(key):
-            s = get_from_env(key)
-            s = s.replace("""'""", '''"''')
-            return json.loads(s)
-        
-        def cast_to_float(val):
-            return float(val) if val is not None else None
-        
-        def get_as_float(key):
-            return cast_to_float(get_from_env(key))
-        
-        self.project_name = get_from_env('project_name')        
-        self.indicator_name = get_from_env('indicator_name')
-        self.project_status = get_dict_env('project_status')
-    
-    def make_hash(self):
-        strings = [self.project_name]
-        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
-        self.indicator_hash = self.generate_unique_code(strings)
+        super().load_env_variables()
+        # output_format: vector (puntos), raster (superficie por categoria) o both
+        self.output_format = self.getenv('output_format', 'vector')
+        self.raster_format = self.getenv('raster_format', 'tif')
+        if self.output_format in ('raster', 'both'):
+            # Sin rasterio un GeoTIFF pedido falla aqui, antes de calcular, en vez de cambiar de formato
+            check_format(self.raster_format)
+        if self.output_format == 'raster':
+            # El frame de puntos sigue en el contexto para las etapas siguientes, pero no se sube
+            self.upload = False
         pass
 
-    def load_distances_paths(self):
-        print(self.indicator_hash)
-        return self.h.load_indicator_data('ga_prox_by_node_points', self.indicator_hash)
-    
-    def load_green_areas(self):
-        return self.h.load_green_areas()
-    
+    @timed
     def load_data(self):
-        self.net = self.h.load_network()
-        self.green_areas = self.h.load_amenities()
-        self.area_of_interest = self.h.load_area_of_interest()
-        self.paths = self.load_distances_paths()
-        pass
-    
-    def set_nodes_gdf(self):
-        from shapely.geometry import Point
-        df = self.net.nodes_df
-        geometry = [Point(xy) for xy in zip(df['x'], df['y'])]
-        self.nodes_gdf = gpd.GeoDataFrame(df, geometry=geometry)
-        self.nodes_gdf.reset_index(inplace=True)
-        self.nodes_gdf = self.nodes_gdf.set_crs(4326)
+        self.net, self.green_areas, self.area_of_interest, self.paths = self.context.prefetch(
+            lambda: self.context.network(self.get_network_id()),
+            self.context.green_areas,
+            self.context.area_of_interest,
+            lambda: self.load_indicator_data('ga_prox_by_node_points'),
+        )
         pass
 
-    def make_mesh_points(self):
-        poly = self.area_of_interest.copy()
-        poly.to_crs(32718, inplace=True)
-
-        x_spacing = int(os.getenv('x_spacing', 20))
-        y_spacing = int(os.getenv('y_spacing', 20))
-
-        xmin, ymin, xmax, ymax = poly.total_bounds #Find the bounds of all polygons in the poly
-        xcoords = [c for c in np.arange(xmin, xmax, x_spacing)] #Create x coordinates
-        ycoords = [c for c in np.arange(ymin, ymax, y_spacing)] #And y
-
-        coordinate_pairs = np.array(np.meshgrid(xcoords, ycoords)).T.reshape(-1, 2) #Create all combinations of xy coordinates
-        geometries = gpd.points_from_xy(coordinate_pairs[:,0], coordinate_pairs[:,1]) #Create a list of shapely points
+    def get_spacing(self):
+        return int(self.getenv('x_spacing', 20)), int(self.getenv('y_spacing', 20))
 
-        pointpoly = gpd.GeoDataFrame(geometry=geometries, crs=poly.crs)
-        pointpoly = pointpoly.to_crs(4326)
-        self.mesh_points = pointpoly.copy()
-        self.mesh_points = gpd.overlay(self.mesh_points, self.area_of_interest)
-        self.mesh_points.drop(columns='name', inplace=True)
-        pass
-
-    def assign_node_to_points(self):
-        self.mesh_points['osm_id'] = self.net.get_node_ids(self.mesh_points['geometry'].x, self.mesh_points['geometry'].y)
-        # self.df_out = pd.merge(self.mesh_points, self.paths[['osm_id','path_length', 'category', 'destination']], on='osm_id')
-        # self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
+    @timed
+    def make_mesh_points(self):
+        x_spacing, y_spacing = self.get_spacing()
+        self.mesh_points = mesh_points(self.area_of_interest, x_spacing, y_spacing)
         pass
 
-    def calculate_distance_to_nodes(self):
-        # Convertimos los nodos a GeoDataFrame si aún no están convertidos
-        if not isinstance(self.nodes_gdf, gpd.GeoDataFrame):
-            self.set_nodes_gdf()
+    def snap_points(self, points):
+        # Nodo mas cercano y distancia al nodo (en metros) en una sola consulta al indice de nodos
+        osm_ids, distances = snap_to_nodes(self.nodes_gdf, points.geometry)
+        points['osm_id'] = osm_ids
+        points['distance_to_closest_node'] = distances
+        return points
 
-        self.nodes_gdf = self.nodes_gdf.to_crs(32718)
-        self.mesh_points = self.mesh_points.to_crs(32718)
+    def merge_paths(self, points):
+        # Realizamos el merge entre los puntos y los paths usando 'osm_id'
+        df = pd.merge(points, self.paths[['osm_id', 'path_length', 'category', 'destination']], on='osm_id')
 
-        # Asociamos cada punto de la malla con su respectivo nodo para calcular la distancia
-        self.mesh_points = self.mesh_points.merge(self.nodes_gdf[['osm_id', 'geometry']], on='osm_id', how='left', suffixes=('', '_node'))
-
-        # Calculamos la distancia entre el punto de la malla y el nodo asignado
-        self.mesh_points['distance_to_closest_node'] = self.mesh_points.apply(
-            lambda row: row['geometry'].distance(row['geometry_node']),
-            axis=1
-        )
+        # Calculamos la distancia total como la suma de la distancia al nodo más cercano y la longitud del camino
+        df['path_length'] = df['distance_to_closest_node'] + df['path_length']
+        return df
 
-        # Limpiamos el DataFrame eliminando la geometría del nodo
-        self.mesh_points.drop(columns=['geometry_node'], inplace=True)
+    def select_columns(self, df):
+        cols = ['osm_id', 'distance_to_closest_node', 'path_length', 'category', 'destination', 'col', 'row', 'geometry']
+        # El indicator_hash viaja como metadato (attrs) del frame al exportar, no como columna
+        df = apply_dtype_policy(df[cols].copy())
+        return gpd.GeoDataFrame(data=df.drop(columns=['geometry']), geometry=df['geometry'], crs=4326)
 
-        self.nodes_gdf = self.nodes_gdf.to_crs(4326)
-        self.mesh_points = self.mesh_points.to_crs(4326)
+    @timed
+    def assign_node_to_points(self):
+        self.mesh_points = self.snap_points(self.mesh_points)
         pass
 
+    @timed
     def merge_with_paths_and_calculate_total_distance(self):
-        # Realizamos el merge entre los mesh_points y los paths usando 'osm_id'
-        self.df_out = pd.merge(self.mesh_points, self.paths[['osm_id', 'path_length', 'category', 'destination']], on='osm_id')
-
-        # Calculamos la distancia total como la suma de la distancia al nodo más cercano y la longitud del camino
-        self.df_out['path_length'] = self.df_out['distance_to_closest_node'] + self.df_out['path_length']
+        self.df_out = self.merge_paths(self.mesh_points)
         pass
     
 
@@ -150,57 +86,83 @@ class Indicator():
         self.df_out.loc[indices_inside_greenareas, 'path_length'] = 0
         pass
     
+    @timed
     def filter_columns(self):
-        cols = ['osm_id', 'distance_to_closest_node', 'path_length', 'category', 'destination', 'geometry']
-        self.df_out = self.df_out[cols]
-        self.df_out['hash'] = self.indicator_hash
-        pass
-    
-    def to_geodataframe(self):
-        self.df_out = gpd.GeoDataFrame(data=self.df_out.drop(columns=['geometry']), geometry=self.df_out['geometry'])
+        self.df_out = self.select_columns(self.df_out)
         pass
 
-    def add_travel_time(self):
-        self.speed = float(os.getenv('speed', 4.5))
+    def process_tile(self, tile, area, x_spacing, y_spacing, origin, kind):
+        points = tile_mesh_points(area, tile, x_spacing, y_spacing, origin, kind=kind)
+        df = self.select_columns(self.merge_paths(self.snap_points(points)))
+        self.add_travel_time(df)
+        return df
+
+    @timed
+    def calculate_tiles(self):
+        # Cada tile se calcula y exporta por separado, asi la memoria no depende del tamano del area de interes
+        x_spacing, y_spacing = self.get_spacing()
+        kind = self.getenv('tile_kind', 'square')
+        # El area se proyecta una sola vez; su indice y el de nodos se construyen antes de repartir los tiles entre hilos
+        area = to_metric(self.area_of_interest)
+        area.sindex
+        self.nodes_gdf.sindex
+        tiles = make_tiles(area, kind=kind, size=float(self.getenv('tile_size')))
+        origin = grid_origin(area)
+
+        self.context.discard_result(self.indicator_name, self.indicator_hash)
+        process = lambda tile: self.process_tile(tile, area, x_spacing, y_spacing, origin, kind)
+        first = True
+        for tile, df_tile in run_tiles(tiles, process, workers=int(self.getenv('tile_workers', 1))):
+            if len(df_tile):
+                # El primer tile reemplaza el resultado de una corrida anterior; los siguientes se agregan
+                self.export_results([(self.indicator_name, self.finish_points(df_tile))], append=True, first=first)
+                first = False
+        self.df_out = None
+        pass
 
-        speed_m_per_min = self.speed * 1000 / 60
-        
-        self.df_out['travel_time'] = self.df_out['path_length'] / speed_m_per_min
+    @timed
+    def make_surface(self):
+        if self.output_format in ('raster', 'both'):
+            x_spacing, y_spacing = self.get_spacing()
+            # Por tiles las bandas se escriben en disco ventana a ventana, sin tenerlas completas en memoria
+            scratch = os.path.join(self.raster_directory(), '.bands') if self.getenv('tile_size', None) else None
+            self.surface = GridSurface(self.area_of_interest, x_spacing, y_spacing, directory=scratch)
         pass
+
+    def finish_points(self, df):
+        # col y row solo ubican cada punto en la superficie raster
+        if self.surface is not None:
+            self.surface.add(df)
+        return df.drop(columns=['col', 'row'])
+
+    @timed
     def calculate(self):
         self.set_nodes_gdf()
+        self.make_surface()
+        if self.getenv('tile_size', None):
+            self.calculate_tiles()
+            return
         self.make_mesh_points()
         self.assign_node_to_points()
-        self.calculate_distance_to_nodes()
         self.merge_with_paths_and_calculate_total_distance()
         self.filter_columns()
-        self.to_geodataframe()
         self.add_travel_time()
+        self.df_out = self.finish_points(self.df_out)
         pass
-    
-    def export_indicator(self):
-        # endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
-        endpoint = f'{self.server_address}/urban-indicators/indicatordata/update_indicator/'
-
-        data = {
-            'indicator_name': self.indicator_name,
-            'indicator_hash': self.indicator_hash,
-            'is_geo': True,
-            'json_data': self.df_out.to_json(),
-        }
-
-        json_data = json.dumps(data)
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
-        if response.status_code == 200:
-            print('Data saved successfully')
-        else:
-            print('Error saving data:', response.text)
-        pass
 
-    def exec(self):
-        self.load_data()
-        self.calculate()
-        self.export_indicator()
+    def raster_directory(self):
+        return os.path.join(self.getenv('raster_path', '/app/tmp/rasters'), self.indicator_name, self.result_hash[:12])
+
+    @timed
+    def write_rasters(self):
+        directory = self.raster_directory()
+        paths = self.surface.write(directory, self.raster_format)
+        # Los rasters quedan en disco local: el backend solo recibe GeoJSON
+        print(f'{len(paths)} rasters written to {directory} (local only, not uploaded)')
         pass
 
+    def export_indicator(self):
+        if self.surface is not None:
+            self.write_rasters()
+        super().export_indicator()
+        pass
@@ -1,11 +1,11 @@
-import numpy as np
 import pandas as pd
 import shapely
 import geopandas as gpd
-import pandana as pdna
-import requests
+import asyncio
 import os
 import hashlib
+from clbb_runtime.client import ApiClient
+from clbb_runtime.instrumentation import timed
 
 def generate_unique_code(strings):
     text = ''.join(strings)
@@ -22,12 +22,14 @@ class Indicator():
         
         self.base_url = f'{self.server_address}/{self.request_data_endpoint}'
         self.roadnetwork_url = f'{self.base_url}/roadnetwork'
+        self.client = ApiClient(self.server_address)
         
+    @timed
     def load_network(self):
         endpoint = f'{self.roadnetwork_url}/{self.id_network}/serve_h5_file/'
         filename = f'/app/tmp/net_{self.id_network}.h5'
         if not os.path.exists(filename):
-            response = requests.get(endpoint)
+            response = self.client.get_sync(endpoint)
             # Verificar si la solicitud fue exitosa
             if response.status_code == 200:
                 # Guardar el contenido del archivo en un archivo local
@@ -36,9 +38,11 @@ class Indicator():
                 print("¡Archivo h5 descargado exitosamente!")
             else:
                 print("Error al descargar el archivo h5:", response.text)
+        import pandana as pdna
         self.net = pdna.Network.from_hdf5(filename)
         pass
 
+    @timed
     def load_env_variables(self):
         self.lat = os.getenv('lat', None)
         self.lon = os.getenv('lon', None)
@@ -55,6 +59,7 @@ class Indicator():
         self.time = float(self.time) if self.time is not None else None
         pass
 
+    @timed
     def load_data(self):
         self.load_network()
         self.load_env_variables()
@@ -63,7 +68,7 @@ class Indicator():
     def get_nodes_from_distance(self):
         max_distance = self.max_distance
         endpoint = f'{self.base_url}/node/?lat={self.lat}&lon={self.lon}&distance={max_distance}'
-        data = requests.get(endpoint)
+        data = self.client.get_sync(endpoint)
         data_json = data.json()
 
         features = data_json['features']
@@ -74,6 +79,7 @@ class Indicator():
         self.nodes_gdf = gpd.GeoDataFrame.from_features(features, crs='EPSG:4326')
         pass
 
+    @timed
     def setup_filter_nodes(self):
         if self.lat and self.lon:
             method = os.getenv('method', 'speed_time')
@@ -85,6 +91,7 @@ class Indicator():
             pass
         pass
 
+    @timed
     def calculate_distance_to_nodes(self):
         q_nodes = self.nodes_gdf.shape[0]
         destination = self.net.get_node_ids(
@@ -125,6 +132,7 @@ class Indicator():
         self.df_paths = self.df_paths[length_filter]
         pass
         
+    @timed
     def calculate(self):
         self.setup_filter_nodes()
         self.calculate_distance_to_nodes()
@@ -169,7 +177,7 @@ class Indicator():
             # json_data.append(json_entry)
  
             # Realizar la solicitud POST
-            response = requests.post(url, json=json_entry)
+            response = self.client.post_sync(url, json=json_entry)
 
             # Verificar si la solicitud fue exitosa
             if response.status_code == 201:
@@ -180,9 +188,10 @@ class Indicator():
                 pass
             pass
 
+    @timed
     def upload_as_points_to_database(self):
         # URL del endpoint
-        pointurl = f'{self.server_address}/urban-indicators/pointindicator/'
+        pointurl = '/urban-indicators/pointindicator/'
         json_data = []
 
         # Iterar sobre las filas del DataFrame
@@ -218,24 +227,37 @@ class Indicator():
                 'geo_field': shapely.Point(geom.x, geom.y).wkt
             }
 
-            # Realizar la solicitud POST
-            response = requests.post(pointurl, json=json_entry)
-
-            # Verificar si la solicitud fue exitosa
-            if response.status_code == 201:
-                # print("Los datos se han subido correctamente.")
-                pass
-            else:
-                print("Error al subir los datos:", response.status_code)
+            json_data.append(json_entry)
+
+        # Las solicitudes POST se envian en paralelo sobre el pool del cliente (hasta api_max_connections a la vez);
+        # solo se reintentan si no se pudo abrir la conexion, ya que el backend pudo haber guardado la fila
+        responses = asyncio.run(self.client.gather(*[
+            lambda client, json_entry=json_entry: self.client.request(client, 'POST', pointurl, json=json_entry)
+            for json_entry in json_data
+        ], return_exceptions=True))
+
+        # Verificar si las solicitudes fueron exitosas; un error en una fila no cancela las demas
+        failed = 0
+        for json_entry, response in zip(json_data, responses):
+            extra = json_entry['extra_properties']
+            if isinstance(response, Exception):
+                failed += 1
+                print(f"Error al subir los datos (source={extra['source']}, destination={extra['destination']}):", repr(response))
+            elif response.status_code != 201:
+                failed += 1
+                print(f"Error al subir los datos (source={extra['source']}, destination={extra['destination']}):", response.status_code)
                 print(response.text)
-                pass
-            pass
+        if failed:
+            print(f'{failed} de {len(json_data)} filas no se pudieron subir')
+        pass
     
+    @timed
     def export_indicator(self):
         # self.upload_as_numeric_to_database()
         self.upload_as_points_to_database()
         pass
 
+    @timed
     def exec(self):
         self.load_data()
         self.calculate()
@@ -1,45 +1,78 @@
-import numpy as np
-import pandas as pd
-import geopandas as gpd
-import requests
 import os
-print(os.environ.get('server_address'))
+import geopandas as gpd
+from shapely.geometry import Polygon
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.landuse import parquet_crs, read_parquet_bbox, clip_areas, shannon_entropy
 
 class Indicator():
     def __init__(self):
         self.data = None
         self.indicator = None
         self.indicator_type = 'numeric'
-    
+
+        self.area_scope_path = os.getenv('area_scope_path', '/app/temp/area_scope.parquet')
+        self.land_uses_path = os.getenv('land_uses_path', '/app/temp/land_uses_future.parquet')
+        self.output_path = os.getenv('output_path', '/app/temp/land_uses_diversity.parquet')
+        self.use_column = os.getenv('use_column', 'Uso')
+        self.area_column = os.getenv('area_column', 'area_predio')
+        # scope=area calcula un unico valor para area_scope, scope=h3 un valor por celda de resolution
+        self.scope = os.getenv('scope', 'area')
+        self.resolution = int(os.getenv('resolution', 9))
+
+    @timed
     def load_data(self):
-        # Proceso para cargar los datos requeridos
-        # self.data = data_loaded
+        # Solo se leen los predios cuyo bbox intersecta el area de estudio
         self.data = {}
-        self.data['area_scope'] = gpd.read_parquet('/app/temp/area_scope.parquet')
-        self.data['land_uses'] = gpd.read_parquet('/app/temp/land_uses_future.parquet')
+        self.data['area_scope'] = gpd.read_parquet(self.area_scope_path)
+        bbox = self.data['area_scope'].to_crs(parquet_crs(self.land_uses_path)).total_bounds
+        columns = [self.use_column] + ([self.area_column] if self.area_column else [])
+        self.data['land_uses'] = read_parquet_bbox(self.land_uses_path, bbox, columns=columns)
         pass
-    
+
+    @timed
+    def make_scopes(self):
+        area_scope = self.data['area_scope'].to_crs(4326)
+        if self.scope == 'h3':
+            from h3 import h3
+            cells = set()
+            for geom in area_scope.explode(index_parts=False).geometry:
+                cells |= h3.polyfill(geom.__geo_interface__, self.resolution, geo_json_conformant=True)
+            cells = sorted(cells)
+            polygons = [Polygon(h3.h3_to_geo_boundary(cell, geo_json=True)) for cell in cells]
+            self.scopes = gpd.GeoDataFrame({'code': cells}, geometry=polygons, crs=4326)
+        else:
+            self.scopes = gpd.GeoDataFrame({'code': ['area_scope']}, geometry=[area_scope.unary_union], crs=4326)
+        pass
+
+    @timed
     def calculate(self):
-        # Proceso para calcular el indicador
-        # self.indicator = indicator_calculated
-        gdf = gpd.overlay(self.data['area_scope'], self.data['land_uses'])
-        total_area_uso = gdf['area_predio'].sum()
+        self.make_scopes()
+        land_uses = self.data['land_uses']
+        # Con area_column vacio se pondera por el area geometrica recortada
+        weight_col = self.area_column or None
+        pairs = clip_areas(land_uses, self.scopes, weight_col=weight_col)
+        pairs['use'] = land_uses[self.use_column].values[pairs['parcel_idx'].values]
 
-        gdf_group_uso = gdf[['Uso', 'area_predio']].groupby('Uso')['area_predio'].agg('sum').reset_index().rename(columns={'area_predio':'area_uso'})
-        gdf_group_uso['porcion_uso'] = gdf_group_uso['area_uso']/total_area_uso
-        gdf_group_uso['info_uso'] = -1*gdf_group_uso['porcion_uso']*np.log2(gdf_group_uso['porcion_uso'])
+        entropy = shannon_entropy(pairs, 'scope_idx', 'use', 'area')
+        self.df_out = self.scopes.copy()
+        self.df_out['entropy'] = entropy.reindex(range(len(self.scopes))).fillna(0).values
 
-        self.indicator = gdf_group_uso['info_uso'].sum()
+        self.indicator = self.df_out['entropy'].iloc[0] if self.scope == 'area' else self.df_out
         pass
-    
+
+    @timed
     def export_indicator(self):
         # Enviar los datos a algún servidor o almacenarlos en algún lugar
-        print(self.indicator)
+        if self.scope == 'area':
+            print(self.indicator)
+        else:
+            self.df_out.to_parquet(self.output_path)
+            print(f'{len(self.df_out)} celdas escritas en {self.output_path}')
         pass
 
+    @timed
     def exec(self):
         self.load_data()
         self.calculate()
         self.export_indicator()
         pass
-
@@ -0,0 +1,86 @@
+import numpy as np
+import geopandas as gpd
+from clbb_runtime.geometry import select_nodes
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.landuse import parquet_crs, read_parquet_bbox, row_entropy
+
+class Indicator(BaseIndicator):
+    hash_params = ('network_id', 'walk_distance', 'decay', 'use_column', 'area_column', 'land_uses_path')
+
+    @timed
+    def load_land_uses(self):
+        path = self.getenv('land_uses_path', '/app/temp/land_uses_future.parquet')
+        self.use_column = self.getenv('use_column', 'Uso')
+        self.area_column = self.getenv('area_column', 'area_predio')
+
+        # Se leen los predios hasta walk_distance fuera del area de interes, que tambien aportan a los nodos del borde
+        walk_distance = float(self.getenv('walk_distance', 800))
+        bbox = self.area_of_interest.to_crs(32718).buffer(walk_distance).to_crs(parquet_crs(path)).total_bounds
+        columns = [self.use_column] + ([self.area_column] if self.area_column else [])
+        self.land_uses = read_parquet_bbox(path, bbox, columns=columns)
+        pass
+
+    @timed
+    def load_data(self):
+        self.net, self.area_of_interest = self.context.prefetch(
+            lambda: self.context.network(self.get_network_id()),
+            self.context.area_of_interest,
+        )
+        self.load_land_uses()
+        pass
+
+    @timed
+    def post_land_uses_to_nodes(self):
+        # Cada predio aporta su area a su nodo mas cercano, una variable de pandana por uso de suelo
+        points = self.land_uses.to_crs(4326).representative_point()
+        node_ids = self.net.get_node_ids(points.x, points.y).values
+        if self.area_column:
+            areas = self.land_uses[self.area_column].astype(float).values
+        else:
+            areas = self.land_uses.to_crs(32718).area.values
+
+        # La red se comparte entre etapas, por lo que las variables llevan el hash del resultado
+        self.variable_prefix = f'land_use_{self.result_hash[:12]}'
+        self.uses = sorted(self.land_uses[self.use_column].dropna().unique())
+        for i, use in enumerate(self.uses):
+            mask = (self.land_uses[self.use_column] == use).values
+            self.net.set(node_ids[mask], variable=areas[mask], name=f'{self.variable_prefix}_{i}')
+        pass
+
+    @timed
+    def aggregate_land_uses(self):
+        # Area de cada uso alcanzable a walk_distance sobre la red, para todos los nodos a la vez
+        walk_distance = float(self.getenv('walk_distance', 800))
+        decay = self.getenv('decay', 'flat')
+        self.net.precompute(walk_distance)
+        reachable = [
+            self.net.aggregate(walk_distance, type='sum', decay=decay, name=f'{self.variable_prefix}_{i}')
+            for i in range(len(self.uses))
+        ]
+        self.reachable = np.column_stack([r.values for r in reachable]) if reachable else np.zeros((len(self.net.node_ids), 0))
+        self.reachable_index = reachable[0].index if reachable else self.net.node_ids
+        pass
+
+    @timed
+    def make_node_layer(self):
+        sources = select_nodes(self.nodes_gdf, self.area_of_interest)[['osm_id', 'geometry']]
+        df = sources.copy()
+        rows = self.reachable_index.get_indexer(df['osm_id'])
+        areas = self.reachable[rows]
+        df['entropy'] = row_entropy(areas)
+        df['land_use_area'] = areas.sum(axis=1)
+        df['land_use_count'] = (areas > 0).sum(axis=1)
+        # Entropia normalizada por el maximo posible con los usos presentes en la red
+        max_entropy = np.log2(len(self.uses)) if len(self.uses) > 1 else 1
+        df['mix_index'] = df['entropy'] / max_entropy
+        self.df_out = gpd.GeoDataFrame(df.reset_index(drop=True), geometry='geometry', crs=4326)
+        pass
+
+    @timed
+    def calculate(self):
+        self.set_nodes_gdf()
+        self.post_land_uses_to_nodes()
+        self.aggregate_land_uses()
+        self.make_node_layer()
+        pass
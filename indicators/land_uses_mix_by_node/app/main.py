@@ -0,0 +1,8 @@
+from indicator import Indicator
+
+def main():
+    indicator = Indicator()
+    indicator.exec()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,9 @@
-import numpy as np
 import pandas as pd
-import shapely
-import geopandas as gpd
-import pandana as pdna
-import requests
 import os
 import hashlib
 import json
+from clbb_runtime.client import ApiClient
+from clbb_runtime.instrumentation import timed
 
 def generate_unique_code(strings):
     text = ''.join(strings)
@@ -24,12 +21,14 @@ class Indicator():
         
         self.base_url = f'{self.server_address}/{self.request_data_endpoint}'
         self.roadnetwork_url = f'{self.base_url}/roadnetwork'
+        self.client = ApiClient(self.server_address)
         
+    @timed
     def load_network(self):
         endpoint = f'{self.roadnetwork_url}/{self.id_network}/serve_h5_file/'
         filename = f'/app/tmp/net_{self.id_network}.h5'
         if not os.path.exists(filename):
-            response = requests.get(endpoint)
+            response = self.client.get_sync(endpoint)
             # Verificar si la solicitud fue exitosa
             if response.status_code == 200:
                 # Guardar el contenido del archivo en un archivo local
@@ -38,9 +37,11 @@ class Indicator():
                 print("¡Archivo h5 descargado exitosamente!")
             else:
                 print("Error al descargar el archivo h5:", response.text)
+        import pandana as pdna
         self.net = pdna.Network.from_hdf5(filename)
         pass
 
+    @timed
     def load_env_variables(self):
 
         def get_from_env(key):
@@ -64,16 +65,19 @@ class Indicator():
         self.indicator_name = get_from_env('indicator_name')
         pass
 
+    @timed
     def set_indicator_hash(self):
         self.indicator_hash = generate_unique_code(self.keywords)
         pass
 
+    @timed
     def load_data(self):
         self.load_network()
         self.load_env_variables()
         self.set_indicator_hash()
         pass
 
+    @timed
     def calculate_between_nodes(self):
         self.ptos['node_id'] = self.net.get_node_ids(
             self.ptos['lon'],
@@ -94,10 +98,12 @@ class Indicator():
         })
         print(self.df_paths.loc[0,:].to_json())
     
+    @timed
     def calculate(self):
         self.calculate_between_nodes()
         pass
     
+    @timed
     def export_indicator(self):
         endpoint = f'{self.server_address}/urban-indicators/indicatordata/upload_to_table/'
 
@@ -110,8 +116,7 @@ class Indicator():
 
         json_data = json.dumps(data)
 
-        headers = {'Content-Type': 'application/json'}
-        response = requests.post(endpoint, headers=headers, data=json_data)
+        response = self.client.post_json_sync(endpoint, json_data)
         print(endpoint)
         if response.status_code == 200:
             print('Datos guardados exitosamente')
@@ -119,6 +124,7 @@ class Indicator():
             print('Error al guardar los datos:', response.text)
         pass
 
+    @timed
     def exec(self):
         self.load_data()
         self.calculate()
@@ -1,9 +1,9 @@
 import geopandas as gpd
-import requests
 import pandas as pd
-import pandana as pdna
 import shapely
 import os
+from clbb_runtime.client import ApiClient
+from clbb_runtime.instrumentation import timed
 
 class Processing:
     def __init__(self):
@@ -12,6 +12,7 @@ class Processing:
         self.id_network = os.getenv('id_roadnetwork', 1)
         self.base_url = f'{self.server_address}/{self.request_data_endpoint}'
         self.roadnetwork_url = f'{self.base_url}/roadnetwork'
+        self.client = ApiClient(self.server_address)
         pass
 
     ############################################################   
@@ -20,9 +21,10 @@ class Processing:
     ############################################################   
     ############################################################ 
     
+    @timed
     def check_h5_file_exists(self):
         endpoint = f'{self.roadnetwork_url}/{self.id_network}/'
-        r = requests.get(endpoint)
+        r = self.client.get_sync(endpoint)
         if r.status_code == 200:
             r_dict = r.json()
             print(r_dict['h5_file'])
@@ -47,13 +49,14 @@ class Processing:
         gdf = gpd.GeoDataFrame.from_features(features, crs='EPSG:4326')
         return gdf
 
+    @timed
     def request_from_nodes_and_edges(self):
 
         edges_url = f'{self.roadnetwork_url}/{self.id_network}/streets/'
         nodes_url = f'{self.roadnetwork_url}/{self.id_network}/nodes/'
         
-        edges_r = requests.get(edges_url)
-        nodes_r = requests.get(nodes_url)
+        edges_r = self.client.get_sync(edges_url)
+        nodes_r = self.client.get_sync(nodes_url)
 
         self.nodes_gdf = self.nodes_geojson_to_gdf(nodes_r.json())
         self.edges_gdf = self.edges_geojson_to_gdf(edges_r.json())
@@ -62,11 +65,12 @@ class Processing:
     ############################################################   
     ############################################################
     
+    @timed
     def load_data(self):
         if not self.check_h5_file_exists():
             # Proceso para cargar los datos requeridos
             endpoint = f'{self.roadnetwork_url}/{self.id_network}/'
-            r = requests.get(endpoint)
+            r = self.client.get_sync(endpoint)
             if r.status_code == 200:
                 self.request_from_nodes_and_edges()
                 self.continue_process = True
@@ -83,6 +87,7 @@ class Processing:
     ############################################################   
     ############################################################
        
+    @timed
     def adjust_nodes_and_edges_format(self):
         nodes = pd.DataFrame(
             {
@@ -118,6 +123,7 @@ class Processing:
         self.edges_gdf = edges.copy()
         pass
 
+    @timed
     def make_pandana_network(self):
         self.net = None
         # Redirige la salida estándar a /dev/null (un objeto nulo)
@@ -126,6 +132,7 @@ class Processing:
             old_stdout = os.dup(1)
             os.dup2(fnull.fileno(), 1)
             # Tu código para crear la red de Pandana aquí
+            import pandana as pdna
             self.net = pdna.Network(
                 self.nodes_gdf['lon'],
                 self.nodes_gdf['lat'],
@@ -140,6 +147,7 @@ class Processing:
     ############################################################   
     ############################################################  
     
+    @timed
     def process_data(self):
         if self.continue_process:
             # Transform nodes_gdf and edges_gdf as a format to make pandana network
@@ -153,6 +161,7 @@ class Processing:
     ############################################################   
     ############################################################  
 
+    @timed
     def upload_h5_file(self):
         self.net.save_hdf5(f'/app/{self.id_network}.h5')
 
@@ -165,8 +174,8 @@ class Processing:
         # Crear un diccionario con el archivo h5 para enviarlo en la solicitud
         files = {'h5_file': open(h5_file_path, 'rb')}
 
-        # Realizar la solicitud POST para cargar el archivo h5
-        response = requests.post(upload_h5_url, files=files)
+        # Realizar la solicitud POST para cargar el archivo h5 (comprimido segun api_compression)
+        response = self.client.post_sync(upload_h5_url, files=files)
 
         # Verificar si la solicitud fue exitosa
         if response.status_code == 200:
@@ -178,6 +187,7 @@ class Processing:
     ############################################################   
     ############################################################  
     
+    @timed
     def export_data(self):
         if self.continue_process:
             self.upload_h5_file()
@@ -191,6 +201,7 @@ class Processing:
     ############################################################   
     ############################################################ 
 
+    @timed
     def execute(self):
         self.load_data()
         self.process_data()
@@ -1,12 +1,12 @@
 from h3 import h3
 import geopandas as gpd
 from shapely.geometry import Polygon
-import contextily as ctx
 import pandas as pd
 import os
-import hermes as hs
-import requests
+import asyncio
 import json
+from clbb_runtime.client import ApiClient
+from clbb_runtime.instrumentation import timed
 
 class Processing:
     # Init
@@ -23,23 +23,27 @@ class Processing:
         self.res = int(os.getenv('resolution', 1))
         self.id_project = int(os.getenv('id_project', 1))
         self.server_address = os.getenv('server_address', 'http://localhost:8000')
+        self.client = ApiClient(self.server_address)
         pass
 
     def start_handler(self):
+        import hermes as hs
         self.h = hs.Handler()
         self.h.server_address = self.server_address
         pass
     
+    @timed
     def load_data(self):
         # self.area = self.h.load_area_of_interest()
         self.load_area_of_interest()
         pass
 
+    @timed
     def load_area_of_interest(self, id=1):
         from shapely import wkt
         area_of_interest = None
         endpoint = f'{self.server_address}/api/areaofinterest/1/'
-        response = requests.get(endpoint)
+        response = self.client.get_sync(endpoint)
         print(response.status_code)
         data = response.json()
         print(data)
@@ -52,6 +56,7 @@ class Processing:
 
     ############################################################
     # Methods
+    @timed
     def get_h3_hexs_from_area(self):
         hexs = h3.polyfill(self.area.geometry[0].__geo_interface__, self.res, geo_json_conformant = True)
         polygonise = lambda hex_id: Polygon(h3.h3_to_geo_boundary(hex_id, geo_json=True))
@@ -61,6 +66,7 @@ class Processing:
         self.all_polys = all_polys
         pass
 
+    @timed
     def adjust_backend_format(self):
         self.all_polys['name'] = f'h3-{self.res}'
         self.all_polys['dist_type'] = 'h3'
@@ -71,6 +77,7 @@ class Processing:
 
     ############################################################
     
+    @timed
     def execute_process(self):
         self.get_h3_hexs_from_area()
         self.adjust_backend_format()
@@ -78,19 +85,32 @@ class Processing:
 
     ############################################################
         
+    @timed
     def export_data(self):
         df_json = self.all_polys.to_json(orient='records')
         df_json = json.loads(df_json)
-        url = f'{self.server_address}/api/discretedistribution/'
-        headers = {'Content-Type': 'application/json'}
-        for feature in df_json:
-            # print(feature)
-            r = requests.post(url, data=json.dumps(feature), headers=headers)
-            print(r.status_code)
+        url = '/api/discretedistribution/'
+        # Los hexagonos se suben en paralelo sobre el pool del cliente (hasta api_max_connections a la vez); solo se
+        # reintentan si no se pudo abrir la conexion, y los cuerpos van comprimidos solo si api_compression lo activa
+        responses = asyncio.run(self.client.gather(*[
+            lambda client, feature=feature: self.client.post_json(client, url, json.dumps(feature))
+            for feature in df_json
+        ], return_exceptions=True))
+        # Un hexagono que falla se informa con su codigo sin cancelar el resto
+        failed = 0
+        for feature, r in zip(df_json, responses):
+            if isinstance(r, Exception):
+                failed += 1
+                print(f"Error al subir el hexagono {feature['code']}:", repr(r))
+            elif r.status_code not in (200, 201):
+                failed += 1
+                print(f"Error al subir el hexagono {feature['code']}:", r.status_code, r.text)
+        print(f'{len(df_json) - failed} de {len(df_json)} hexagonos subidos')
         pass
 
     ############################################################
 
+    @timed
     def execute(self):
         self.load_data()
         self.execute_process()
@@ -0,0 +1,179 @@
+import asyncio
+import gzip
+import os
+import random
+
+import httpx
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+COMPRESS_METHODS = ('POST', 'PUT', 'PATCH')
+
+
+def available_codecs():
+    """Request codecs that can be used here, in order of preference."""
+    return ['zstd', 'gzip'] if zstandard is not None else ['gzip']
+
+
+def compress(codec, content):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(content)
+    return gzip.compress(content, compresslevel=6)
+
+
+def parse_compression(value):
+    """Compression rules from 'auto', a codec, 'none', 'identity' or 'prefix=codec' items separated by commas.
+
+    Returns the default rule and a list of (path prefix, rule), longest
+    prefix first: 'auto,api/roadnetwork/=none' compresses every request
+    body except the network files. 'none' sends bodies uncompressed and
+    'identity' also asks for uncompressed responses.
+    """
+    default, rules = 'none', []
+    for item in (value or 'none').split(','):
+        item = item.strip()
+        if '=' in item:
+            prefix, rule = item.split('=', 1)
+            rules.append(('/' + prefix.strip().lstrip('/'), rule.strip()))
+        elif item:
+            default = item
+    return default, sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+
+class ApiClient():
+    """Async client for the backend API with a shared connection pool.
+
+    Idempotent requests (GET, PUT, DELETE...) that fail with a transport
+    error or a retryable status are retried with exponential backoff and
+    jitter. POST and PATCH are only retried when the connection could not
+    be opened, since the server may have applied a request that timed out
+    or failed. Settings come from the
+    environment: api_timeout (s), api_retries, api_backoff (s) and
+    api_max_connections. The ``*_sync`` helpers run one request from
+    blocking code; ``gather`` runs several coroutines over one pool.
+
+    Responses are negotiated through Accept-Encoding. Request bodies are
+    sent uncompressed unless api_compression opts in: with
+    api_compression=auto, bodies of at least api_compression_min_bytes are
+    sent with Content-Encoding zstd (when zstandard is installed) or gzip.
+    The codec can be set per path prefix (see ``parse_compression``); only
+    enable it for backends that decode Content-Encoding on requests. A
+    codec the server answers 415 to is not used again, and the body is
+    resent with the next one or uncompressed. A 400 to a compressed body is
+    resent uncompressed once, and the codec is dropped if that one is not
+    rejected as well.
+    """
+    def __init__(self, server_address, timeout=None, retries=None, backoff=None, max_connections=None, compression=None):
+        self.server_address = server_address.rstrip('/')
+        self.timeout = float(timeout or os.getenv('api_timeout', 60))
+        self.retries = int(retries if retries is not None else os.getenv('api_retries', 3))
+        self.backoff = float(backoff or os.getenv('api_backoff', 0.5))
+        self.max_connections = int(max_connections or os.getenv('api_max_connections', 8))
+        self.compression = parse_compression(compression or os.getenv('api_compression', 'none'))
+        self.min_compress_bytes = int(os.getenv('api_compression_min_bytes', 1024))
+        self.rejected = set()
+        pass
+
+    def compression_rule(self, path):
+        """Rule of the longest prefix matching ``path`` (a path or a full URL)."""
+        # Las URLs armadas como f'{server}/{"/api"}' traen doble barra
+        path = '/' + httpx.URL(str(path)).path.lstrip('/')
+        default, rules = self.compression
+        return next((rule for prefix, rule in rules if path.startswith(prefix)), default)
+
+    def codecs_for(self, path):
+        """Codecs to try, in order, for request bodies sent to ``path``."""
+        rule = self.compression_rule(path)
+        if rule in ('none', 'identity'):
+            return []
+        codecs = available_codecs() if rule == 'auto' else [codec for codec in (rule, 'gzip') if codec in available_codecs()]
+        return [codec for codec in dict.fromkeys(codecs) if codec not in self.rejected]
+
+    def make_client(self):
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        return httpx.AsyncClient(base_url=self.server_address, timeout=self.timeout, limits=limits)
+
+    async def request(self, client, method, path, **kwargs):
+        codecs = self.codecs_for(path)
+        if self.compression_rule(path) == 'identity':
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'Accept-Encoding': 'identity'})
+        elif method in COMPRESS_METHODS and codecs:
+            request = client.build_request(method, path, **kwargs)
+            body = request.read()
+            if len(body) >= self.min_compress_bytes:
+                return await self.send_compressed(client, request, body, codecs)
+        return await self.send(client, method, path, **kwargs)
+
+    async def send_compressed(self, client, request, body, codecs):
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in ('content-length', 'host')}
+        for codec in codecs:
+            # La compresion de cuerpos grandes corre en un hilo para no frenar las otras subidas
+            content = await asyncio.to_thread(compress, codec, body)
+            response = await self.send(client, request.method, request.url, content=content, headers=dict(headers, **{'Content-Encoding': codec}))
+            if response.status_code == 415:
+                self.rejected.add(codec)
+                continue
+            if response.status_code != 400:
+                return response
+            # Un backend que no decodifica Content-Encoding (p. ej. DRF) responde 400 en vez de 415
+            plain = await self.send(client, request.method, request.url, content=body, headers=headers)
+            if plain.status_code != 400:
+                self.rejected.add(codec)
+            return plain
+        return await self.send(client, request.method, request.url, content=body, headers=headers)
+
+    async def send(self, client, method, path, **kwargs):
+        idempotent = str(method).upper() in IDEMPOTENT_METHODS
+        # Sin idempotencia solo se reintenta si la solicitud no llego a enviarse
+        retry_errors = httpx.TransportError if idempotent else (httpx.ConnectError, httpx.ConnectTimeout)
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.request(method, path, **kwargs)
+                if not idempotent or response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+            except retry_errors:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+
+    async def get_json(self, client, path, **kwargs):
+        response = await self.request(client, 'GET', path, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def post_json(self, client, path, content, **kwargs):
+        headers = {'Content-Type': 'application/json'}
+        return await self.request(client, 'POST', path, content=content, headers=headers, **kwargs)
+
+    async def gather(self, *calls, limit=None, return_exceptions=False):
+        """Run ``calls`` (functions taking the pooled client) concurrently.
+
+        At most ``limit`` calls (default api_max_connections) run at once.
+        With ``return_exceptions`` a failed call returns its exception in
+        place of a result and the other calls go on.
+        """
+        semaphore = asyncio.Semaphore(limit or self.max_connections)
+
+        async def bounded(call, client):
+            async with semaphore:
+                return await call(client)
+
+        async with self.make_client() as client:
+            return await asyncio.gather(*[bounded(call, client) for call in calls], return_exceptions=return_exceptions)
+
+    def get_json_sync(self, path, **kwargs):
+        return asyncio.run(self.gather(lambda client: self.get_json(client, path, **kwargs)))[0]
+
+    def get_sync(self, path, **kwargs):
+        return asyncio.run(self.gather(lambda client: self.request(client, 'GET', path, **kwargs)))[0]
+
+    def post_sync(self, path, **kwargs):
+        return asyncio.run(self.gather(lambda client: self.request(client, 'POST', path, **kwargs)))[0]
+
+    def post_json_sync(self, path, content, **kwargs):
+        return asyncio.run(self.gather(lambda client: self.post_json(client, path, content, **kwargs)))[0]
@@ -0,0 +1,220 @@
+import asyncio
+import io
+import itertools
+import os
+import tempfile
+import threading
+
+import geopandas as gpd
+import pandas as pd
+from shapely import wkt
+
+from clbb_runtime.client import ApiClient
+from clbb_runtime.frames import apply_dtype_policy
+from clbb_runtime.geometry import make_nodes_gdf
+
+
+def features_to_gdf(data):
+    geometries = []
+    properties = []
+    for feature in data['features']:
+        geometries.append(wkt.loads(feature['geometry'].split(';')[-1]))
+        properties.append(feature['properties'])
+    return apply_dtype_policy(gpd.GeoDataFrame(properties, geometry=geometries, crs=4326))
+
+
+def apply_layer_edits(layer, edits):
+    """Scenario version of ``layer`` with ``edits`` applied.
+
+    Rows whose ``key`` column (default 'id') is listed in 'remove' are
+    dropped and the features in 'add' (a GeoJSON FeatureCollection or the
+    path of a file readable by geopandas) are appended.
+    """
+    key = edits.get('key', 'id')
+    layer = layer[~layer[key].isin(edits.get('remove', []))] if edits.get('remove') else layer
+    added = edits.get('add', None)
+    if added is not None:
+        if isinstance(added, str):
+            added = gpd.read_parquet(added) if added.endswith('.parquet') else gpd.read_file(added)
+        else:
+            added = gpd.GeoDataFrame.from_features(added, crs=4326)
+        layer = pd.concat([layer, added.to_crs(layer.crs)], ignore_index=True)
+    return apply_dtype_policy(gpd.GeoDataFrame(layer, geometry=layer.geometry.name, crs=layer.crs))
+
+
+class JobContext():
+    """Layers shared by every indicator that runs inside one job.
+
+    Each layer is loaded on first use and memoized, so stages running in the
+    same process (by_node -> grid_points -> aggregation -> separate) reuse
+    the network, its node frame and spatial index, the area of interest and
+    the amenities instead of downloading them again. Results exported by a
+    stage are kept in memory and served to later stages before falling back
+    to the server. With ``upload=False`` results are only kept in memory.
+    ``handoff='arrow'`` keeps results as GeoParquet buffers instead of frames,
+    which is more compact for large intermediate layers. Results built part
+    by part (tiles) are spilled to GeoParquet files in a temporary directory,
+    so the memory of a tiled stage does not grow with the area. Requests made by
+    the runtime itself go through ``client`` (pooled, with retries);
+    ``prefetch`` overlaps independent layer loads.
+    """
+    def __init__(self, server_address=None, upload=True, handoff='memory'):
+        self.server_address = server_address or os.getenv('server_address', 'http://localhost:8000')
+        self.upload = upload
+        self.handoff = handoff
+
+        self._h = None
+        self.client = ApiClient(self.server_address)
+
+        self.layers = {}
+        self.results = {}
+        self.result_hashes = {}
+        self.computed = {}
+        self.parent = None
+        self.layer_edits = {}
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.spill = None
+        self.part_ids = itertools.count()
+        pass
+
+    @property
+    def h(self):
+        # hermes trae pandana y tables, por lo que se importa recien cuando se pide una capa
+        if self.parent is not None:
+            return self.parent.h
+        with self.lock:
+            if self._h is None:
+                import hermes as hs
+                self._h = hs.Handler()
+                self._h.server_address = self.server_address
+        return self._h
+
+    def scenario(self, layer_edits=None):
+        """Child context for another project_status variant.
+
+        Layers are shared with this context, except the ones named in
+        ``layer_edits`` ({layer: edits}, see ``apply_layer_edits``), which
+        the scenario sees with its edits applied. Results are kept apart,
+        while the cache of computed partial results is shared, so a scenario
+        only computes what differs from the ones before it.
+        """
+        child = JobContext(self.server_address, upload=self.upload, handoff=self.handoff)
+        child.client = self.client
+        child.parent = self
+        child.layer_edits = dict(layer_edits or {})
+        return child
+
+    def get(self, key, loader):
+        name = key if isinstance(key, str) else key[0]
+        if self.parent is not None:
+            if name not in self.layer_edits:
+                return self.parent.get(key, loader)
+            base_loader = loader
+            loader = lambda: apply_layer_edits(self.parent.get(key, base_loader), self.layer_edits[name])
+        if key in self.layers:
+            return self.layers[key]
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self.layers:
+                self.layers[key] = loader()
+        return self.layers[key]
+
+    def has_computed(self, key):
+        if self.parent is not None:
+            return self.parent.has_computed(key)
+        return key in self.computed
+
+    def memoize(self, key, compute):
+        if self.parent is not None:
+            return self.parent.memoize(key, compute)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(('computed', key), threading.Lock())
+        with key_lock:
+            if key not in self.computed:
+                self.computed[key] = compute()
+        return self.computed[key]
+
+    def prefetch(self, *loaders):
+        """Run independent loaders concurrently and return their results in order.
+
+        The hermes loaders are blocking, so each one runs in a worker thread;
+        the per-key locks in ``get`` keep a layer from being loaded twice.
+        """
+        async def gather():
+            return await asyncio.gather(*[asyncio.to_thread(loader) for loader in loaders])
+        return asyncio.run(gather())
+
+    def network(self, id_network=None):
+        if id_network is None:
+            return self.get(('network', None), self.h.load_network)
+        return self.get(('network', id_network), lambda: self.h.load_network(id_network=id_network))
+
+    def nodes_gdf(self, id_network=None):
+        return self.get(('nodes_gdf', id_network), lambda: make_nodes_gdf(self.network(id_network).nodes_df))
+
+    def amenities(self):
+        return self.get('amenities', lambda: apply_dtype_policy(self.h.load_amenities()))
+
+    def green_areas(self):
+        return self.get('green_areas', lambda: apply_dtype_policy(self.h.load_green_areas()))
+
+    def area_of_interest(self, id=None):
+        if id is None:
+            return self.get(('area_of_interest', None), self.h.load_area_of_interest)
+        return self.get(('area_of_interest', id), lambda: self.h.load_area_of_interest(id=id))
+
+    def aggregation_units(self):
+        def load():
+            return features_to_gdf(self.client.get_json_sync('/api/discretedistribution/'))
+        return self.get('aggregation_units', load)
+
+    def result_hash(self, indicator_name, indicator_hash):
+        return self.result_hashes.get((indicator_name, indicator_hash), None)
+
+    def store_result(self, indicator_name, indicator_hash, df, result_hash=None):
+        self.discard_result(indicator_name, indicator_hash)
+        self.result_hashes[(indicator_name, indicator_hash)] = result_hash
+        if self.handoff == 'arrow':
+            buffer = io.BytesIO()
+            df.to_parquet(buffer)
+            df = buffer.getvalue()
+        self.results[(indicator_name, indicator_hash)] = df
+        pass
+
+    def append_result(self, indicator_name, indicator_hash, df, result_hash=None):
+        """Add a part (e.g. one tile) to a result built piece by piece.
+
+        Parts are written to GeoParquet files in the spill directory, and
+        only their paths are kept; they are concatenated when read.
+        """
+        with self.lock:
+            if self.spill is None:
+                # Se borra con el contexto (o al terminar el proceso)
+                self.spill = tempfile.TemporaryDirectory(prefix='clbb_parts_')
+            path = os.path.join(self.spill.name, f'{next(self.part_ids)}.parquet')
+        df.to_parquet(path)
+        with self.lock:
+            self.result_hashes[(indicator_name, indicator_hash)] = result_hash
+            self.results.setdefault((indicator_name, indicator_hash), []).append(path)
+        pass
+
+    def discard_result(self, indicator_name, indicator_hash):
+        result = self.results.pop((indicator_name, indicator_hash), None)
+        if isinstance(result, list):
+            for path in result:
+                os.remove(path)
+        pass
+
+    def indicator_data(self, indicator_name, indicator_hash):
+        key = (indicator_name, indicator_hash)
+        if key in self.results:
+            result = self.results[key]
+            if isinstance(result, list):
+                parts = [gpd.read_parquet(path) for path in result]
+                return gpd.GeoDataFrame(pd.concat(parts, ignore_index=True), crs=parts[0].crs) if parts else None
+            if isinstance(result, bytes):
+                return gpd.read_parquet(io.BytesIO(result))
+            return result.copy()
+        return self.h.load_indicator_data(indicator_name, indicator_hash)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import shapely
+
+# Columnas que, junto a la geometria, identifican una fila de los resultados
+KEY_COLUMNS = ('source', 'code', 'category', 'rank')
+
+
+def default_key(df):
+    geometry = getattr(df, '_geometry_column_name', None)
+    return [col for col in KEY_COLUMNS if col in df.columns] + ([geometry] if geometry in df.columns else [])
+
+
+def plain_columns(df, decimals=3):
+    """Copy of ``df`` that hashes stably: geometries as WKB and floats rounded as they are uploaded."""
+    geometry = getattr(df, '_geometry_column_name', None)
+    plain = {}
+    for col in df.columns:
+        values = df[col]
+        if col == geometry:
+            values = pd.Series(shapely.to_wkb(values.values, hex=True), index=df.index)
+        elif pd.api.types.is_float_dtype(values.dtype):
+            values = values.astype(np.float64).round(decimals)
+        plain[col] = values
+    return pd.DataFrame(plain, index=df.index)
+
+
+def row_hashes(df, key=None):
+    """Key hash and content hash (uint64) of every row of ``df``."""
+    plain = plain_columns(df)
+    key = list(key or default_key(df))
+    return pd.DataFrame({
+        'row_key': pd.util.hash_pandas_object(plain[key], index=False).values,
+        'row_hash': pd.util.hash_pandas_object(plain, index=False).values,
+    }, index=df.index)
+
+
+def diff_rows(previous, current):
+    """Compare the row hashes of the last upload with the current ones.
+
+    Returns masks over ``current`` of the inserted rows (new key) and the
+    updated rows (known key, different content), and the keys of
+    ``previous`` rows that no longer exist.
+    """
+    known = current['row_key'].isin(previous['row_key']).values
+    unchanged = pd.MultiIndex.from_frame(current[['row_key', 'row_hash']]).isin(
+        pd.MultiIndex.from_frame(previous[['row_key', 'row_hash']])
+    )
+    deleted = previous.loc[~previous['row_key'].isin(current['row_key']), 'row_key'].values
+    return ~known, known & ~unchanged, deleted
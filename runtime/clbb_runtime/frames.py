@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+
+# pandana devuelve 4294967.295 (2**32 - 1 en milimetros) cuando no hay camino entre dos nodos
+UNREACHABLE = 4294967.295
+
+
+def mark_unreachable(path_lengths):
+    """Path lengths as float32 with pandana's no-path sentinel replaced by NaN."""
+    path_lengths = np.asarray(path_lengths, dtype=np.float64)
+    return np.where(path_lengths >= UNREACHABLE - 1, np.nan, path_lengths).astype(np.float32)
+
+
+def nearest_per_group(df, by, distance_col='path_length', tie_col='destination'):
+    """One row per group of ``by``: the closest one, ties broken by ``tie_col``.
+
+    Rows with a NaN distance sort last, so a group keeps its NaN row only when
+    nothing in it is reachable.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    df = df.sort_values([distance_col, tie_col], na_position='last', kind='mergesort')
+    return df.drop_duplicates(subset=by, keep='first')
+
+
+def compact_paths(df, unreachable='drop'):
+    """Compact node -> destination table: one row per (source, category, rank).
+
+    Unreachable pairs (NaN path_length) are dropped, or kept with a null
+    destination when ``unreachable='keep'``. Columns are typed as category
+    (int codes), float32 distances and int64 node ids.
+    """
+    keys = ['source', 'category'] + (['rank'] if 'rank' in df.columns else [])
+    df = nearest_per_group(df, keys)
+    if unreachable == 'drop':
+        df = df[df['path_length'].notna()]
+
+    df = df.astype({'source': np.int64, 'category': 'category', 'path_length': np.float32})
+    if unreachable == 'drop':
+        df['destination'] = df['destination'].astype(np.int64)
+    else:
+        # El destino de un par sin camino no es alcanzable: queda nulo
+        df['destination'] = df['destination'].astype('Int64').mask(df['path_length'].isna())
+    if 'rank' in df.columns:
+        df['rank'] = df['rank'].astype(np.int8)
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def json_ready(df, decimals=3):
+    """Copy of ``df`` whose float32 columns are rounded float64.
+
+    float32 values print with all their binary digits when serialized
+    (1234.567 -> 1234.5670166015625); rounding keeps the payload short.
+    """
+    float32_cols = [col for col, dtype in df.dtypes.items() if dtype == np.float32]
+    if not float32_cols:
+        return df
+    df = df.copy()
+    df[float32_cols] = df[float32_cols].astype(np.float64).round(decimals)
+    return df
+
+
+CATEGORICAL_COLUMNS = ('category', 'name', 'code', 'dist_type')
+# Ids de nodos y coordenadas mantienen su tipo: se cruzan entre tablas y float32 pierde precision en grados
+ID_COLUMNS = ('osm_id', 'source', 'destination', 'node_id', 'id')
+COORDINATE_COLUMNS = ('x', 'y', 'lat', 'lon')
+
+
+def apply_dtype_policy(df, categorical=CATEGORICAL_COLUMNS):
+    """Shrink the columns of ``df`` in place and return it.
+
+    Repeated string columns listed in ``categorical`` become categoricals,
+    other floats become float32 and integers are downcast to the smallest
+    type that holds them. Node ids, coordinates and the geometry are kept.
+    """
+    geometry = getattr(df, '_geometry_column_name', None)
+    for col in df.columns:
+        dtype = df[col].dtype
+        if col == geometry or col in ID_COLUMNS or col in COORDINATE_COLUMNS:
+            continue
+        if col in categorical:
+            if not isinstance(dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif pd.api.types.is_float_dtype(dtype):
+            df[col] = df[col].astype(np.float32)
+        elif pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_extension_array_dtype(dtype):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
+def memory_report(df):
+    """Rows, total bytes and bytes per column of ``df`` (strings counted deeply)."""
+    usage = df.memory_usage(deep=True, index=True)
+    return {
+        'rows': len(df),
+        'total_bytes': int(usage.sum()),
+        'columns': {str(col): int(value) for col, value in usage.items()},
+    }
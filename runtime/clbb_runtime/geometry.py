@@ -0,0 +1,90 @@
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def make_nodes_gdf(nodes_df, crs=4326):
+    """GeoDataFrame of the network nodes built with points_from_xy.
+
+    The frame keeps the node id as the 'osm_id' column. Its spatial index
+    (an STRtree behind ``nodes_gdf.sindex``) is built on the first query and
+    cached on the frame, so callers should reuse the same object instead of
+    copying or reprojecting it.
+    """
+    nodes_gdf = nodes_df.reset_index()
+    geometry = gpd.points_from_xy(nodes_gdf['x'].values, nodes_gdf['y'].values)
+    return gpd.GeoDataFrame(nodes_gdf, geometry=geometry, crs=crs)
+
+
+def snap_to_nodes(nodes_gdf, points, metric_crs=32718):
+    """Nearest node for every point and the snapping distance in meters.
+
+    Returns ``(osm_ids, distances)`` aligned with ``points``.
+    """
+    points = gpd.GeoSeries(points).reset_index(drop=True)
+    input_idx, tree_idx = nodes_gdf.sindex.nearest(points, return_all=False)
+    order = np.argsort(input_idx)
+    tree_idx = tree_idx[order]
+
+    osm_ids = nodes_gdf['osm_id'].values[tree_idx]
+    nodes = gpd.GeoSeries(nodes_gdf.geometry.values[tree_idx], crs=nodes_gdf.crs)
+    distances = points.to_crs(metric_crs).distance(nodes.to_crs(metric_crs))
+    return osm_ids, distances.values
+
+
+def nodes_within(nodes_gdf, polygons, columns=None):
+    """Point-in-polygon selection of nodes through the nodes' spatial index.
+
+    Candidate nodes come from the STRtree and the intersects predicate is
+    evaluated against prepared polygons, so no geometry is rebuilt. Returns
+    one row per (node, polygon) match with 'osm_id', 'node_idx' (position in
+    ``nodes_gdf``) and the requested polygon ``columns``.
+    """
+    if polygons.crs is not None and polygons.crs != nodes_gdf.crs:
+        polygons = polygons.to_crs(nodes_gdf.crs)
+    poly_idx, node_idx = nodes_gdf.sindex.query(polygons.geometry.values, predicate='intersects')
+
+    matches = pd.DataFrame({
+        'osm_id': nodes_gdf['osm_id'].values[node_idx],
+        'node_idx': node_idx,
+    })
+    for col in columns or []:
+        matches[col] = polygons[col].values[poly_idx]
+    return matches
+
+
+def select_nodes(nodes_gdf, polygons):
+    """Rows of ``nodes_gdf`` inside any of the polygons, without duplicates."""
+    node_idx = np.unique(nodes_within(nodes_gdf, polygons)['node_idx'].values)
+    return nodes_gdf.iloc[node_idx]
+
+
+def boundary_access_points(polygons, spacing, columns=None, metric_crs=32718):
+    """Points resampled every ``spacing`` meters along every polygon ring.
+
+    MultiPolygons are split into their parts and interior rings are sampled
+    as well as the exterior. Finely digitized boundaries are thinned and long
+    straight edges are densified, so the number of points depends on the
+    perimeter only. Returns a GeoDataFrame in the CRS of ``polygons`` with the
+    requested ``columns`` copied from the source polygon.
+    """
+    columns = list(columns or [])
+    rings = polygons[columns + ['geometry']].to_crs(metric_crs)
+    rings = rings.explode(index_parts=False)
+    rings = rings.set_geometry(rings.boundary).explode(index_parts=False)
+    rings = rings[~rings.geometry.is_empty].reset_index(drop=True)
+
+    lengths = rings.length.values
+    counts = np.maximum(np.ceil(lengths / spacing), 1).astype(int)
+    ring_idx = np.repeat(np.arange(len(rings)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    offsets = position * np.repeat(lengths / counts, counts)
+
+    geometry = shapely.line_interpolate_point(rings.geometry.values[ring_idx], offsets)
+    points = gpd.GeoDataFrame(
+        rings[columns].iloc[ring_idx].reset_index(drop=True),
+        geometry=geometry,
+        crs=metric_crs,
+    )
+    return points.to_crs(polygons.crs)
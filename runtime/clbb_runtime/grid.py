@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+
+# Desplazamiento (m) que decide a que hexagono pertenece un punto sobre un borde compartido
+EDGE_NUDGE = (1e-6, 0.618e-6)
+
+
+def to_metric(polygons, metric_crs=32718):
+    """``polygons`` in ``metric_crs``, reprojected only when needed.
+
+    Projecting once and passing the result to every tile also reuses its
+    spatial index, which geopandas keeps on the frame.
+    """
+    return polygons if polygons.crs == metric_crs else polygons.to_crs(metric_crs)
+
+
+def grid_origin(polygons, metric_crs=32718):
+    """Lower-left corner of the mesh, shared by every tile of ``polygons``."""
+    xmin, ymin, _, _ = to_metric(polygons, metric_crs).total_bounds
+    return xmin, ymin
+
+
+def mesh_points(polygons, x_spacing, y_spacing, origin=None, bounds=None, metric_crs=32718):
+    """Regular mesh of points every x/y spacing meters inside ``polygons``.
+
+    Points are aligned to ``origin`` (by default the corner of ``polygons``)
+    and only generated within ``bounds`` (metric xmin, ymin, xmax, ymax), so
+    tiles sharing an origin produce disjoint parts of the same mesh. 'col'
+    and 'row' give the position of every point on the full mesh. Returns a
+    GeoDataFrame in EPSG:4326.
+    """
+    area = to_metric(polygons, metric_crs)
+    x0, y0 = origin if origin is not None else grid_origin(polygons, metric_crs)
+    xmin, ymin, xmax, ymax = bounds if bounds is not None else area.total_bounds
+
+    cols = np.arange(max(np.ceil((xmin - x0) / x_spacing), 0), np.ceil((xmax - x0) / x_spacing), dtype=np.int64)
+    rows = np.arange(max(np.ceil((ymin - y0) / y_spacing), 0), np.ceil((ymax - y0) / y_spacing), dtype=np.int64)
+    col, row = [a.ravel() for a in np.meshgrid(cols, rows, indexing='ij')]
+    points = gpd.GeoDataFrame(
+        {'col': col.astype(np.int32), 'row': row.astype(np.int32)},
+        geometry=gpd.points_from_xy(x0 + col * x_spacing, y0 + row * y_spacing),
+        crs=metric_crs,
+    )
+
+    # Punto en poligono con el indice espacial en vez de un overlay
+    point_idx, _ = area.sindex.query(points.geometry.values, predicate='intersects')
+    points = points.iloc[np.unique(point_idx)].reset_index(drop=True)
+    return points.to_crs(4326)
+
+
+def make_tiles(polygons, kind='square', size=2000, metric_crs=32718):
+    """Tiles covering ``polygons``: squares of ``size`` meters or H3 cells of resolution ``size``.
+
+    Returns a GeoDataFrame in ``metric_crs`` with 'tile_id' and the tile
+    polygons, keeping only tiles that touch the area.
+    """
+    area = to_metric(polygons, metric_crs)
+    if kind == 'h3':
+        from h3 import h3
+        cells = set()
+        for geom in polygons.to_crs(4326).explode(index_parts=False).geometry:
+            cells |= h3.polyfill(geom.__geo_interface__, int(size), geo_json_conformant=True)
+        # polyfill usa los centroides, por lo que se agregan los vecinos para cubrir el borde
+        cells = sorted(set().union(*[h3.k_ring(cell, 1) for cell in cells])) if cells else []
+        geometry = [shapely.Polygon(h3.h3_to_geo_boundary(cell, geo_json=True)) for cell in cells]
+        tiles = gpd.GeoDataFrame({'tile_id': cells}, geometry=geometry, crs=4326).to_crs(metric_crs)
+    else:
+        xmin, ymin, xmax, ymax = area.total_bounds
+        xs = np.arange(xmin, xmax, size)
+        ys = np.arange(ymin, ymax, size)
+        x, y = [a.ravel() for a in np.meshgrid(xs, ys, indexing='ij')]
+        geometry = shapely.box(x, y, x + size, y + size)
+        tiles = gpd.GeoDataFrame({'tile_id': np.arange(len(x))}, geometry=geometry, crs=metric_crs)
+
+    tile_idx, _ = area.sindex.query(tiles.geometry.values, predicate='intersects')
+    return tiles.iloc[np.unique(tile_idx)].reset_index(drop=True)
+
+
+def tile_mesh_points(polygons, tile, x_spacing, y_spacing, origin, kind='square', metric_crs=32718):
+    """Mesh points of ``polygons`` that belong to ``tile`` (a row of make_tiles).
+
+    ``polygons`` should already be in ``metric_crs`` (see ``to_metric``) so
+    tiles do not reproject the area again. mesh_points treats bounds as
+    half-open, so square tiles never share a point. H3 tiles keep the points
+    within their hexagon, and a point on an edge shared by two hexagons goes
+    to the one that contains it after a fixed tiny shift (EDGE_NUDGE), so it
+    is kept exactly once.
+    """
+    points = mesh_points(polygons, x_spacing, y_spacing, origin=origin, bounds=tile.geometry.bounds, metric_crs=metric_crs)
+    if kind == 'h3':
+        # Coordenadas metricas exactas desde col/row, sin el error de ida y vuelta de to_crs
+        geoms = shapely.points(origin[0] + points['col'].to_numpy() * x_spacing, origin[1] + points['row'].to_numpy() * y_spacing)
+        inside = shapely.within(geoms, tile.geometry)
+        edge = ~inside & shapely.covers(tile.geometry, geoms)
+        if edge.any():
+            nudged = shapely.points(shapely.get_x(geoms[edge]) + EDGE_NUDGE[0], shapely.get_y(geoms[edge]) + EDGE_NUDGE[1])
+            inside[edge] = shapely.within(nudged, tile.geometry)
+        points = points[inside].reset_index(drop=True)
+    return points
+
+
+def run_tiles(tiles, process, workers=1):
+    """Run ``process(tile)`` over every tile, yielding (tile, result) as they finish.
+
+    At most ``2 * workers`` tiles are in flight, so finished results have to
+    be consumed (exported) before more tiles are started and memory stays
+    bounded whatever the size of the area.
+    """
+    rows = (tile for _, tile in tiles.iterrows())
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for tile in rows:
+            pending[executor.submit(process, tile)] = tile
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        for future in list(pending):
+            yield pending.pop(future), future.result()
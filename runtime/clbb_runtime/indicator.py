@@ -0,0 +1,415 @@
+import asyncio
+import hashlib
+import json
+import os
+
+import httpx
+import numpy as np
+
+from clbb_runtime.context import JobContext
+from clbb_runtime.delta import diff_rows, row_hashes
+from clbb_runtime.frames import apply_dtype_policy, json_ready, memory_report
+from clbb_runtime.instrumentation import timed
+from clbb_runtime.store import ResultStore
+
+
+def generate_unique_code(strings):
+    text = ''.join(strings)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def has_rows(body):
+    """Whether a (short) indicatordata answer holds any row."""
+    try:
+        data = json.loads(body or b'null')
+    except ValueError:
+        return False
+    if isinstance(data, dict):
+        for key in ('count', 'features', 'results'):
+            if key in data:
+                value = data[key]
+                return value > 0 if isinstance(value, (int, float)) else bool(value)
+    return bool(data)
+
+
+class BaseIndicator():
+    """Shared lifecycle of the proximity indicators.
+
+    Configuration is read with ``getenv``: values in ``params`` take
+    precedence over the environment, which lets several indicators run in one
+    process with different settings. Layers come from ``context`` (a
+    JobContext created per indicator when none is given).
+
+    ``indicator_hash`` identifies the scenario (project_name and
+    project_status) and is the key shared by a chain of indicators and the
+    backend. ``result_hash`` adds the ``hash_params`` that change the result
+    and the result_hash of every upstream stage it reads (``upstream`` names
+    and the stages named by the ``upstream_params``), and keys the local
+    ResultStore. With memoize=1, when it matches a stored result the
+    calculation is skipped, unless force is set. Memoization is off by
+    default because the layers read from the backend are not part of the key.
+    """
+    upload_endpoint = 'update_indicator'
+    # Endpoint que reemplaza las filas del indicator_hash en vez de agregarlas
+    replace_endpoint = 'update_indicator'
+    hash_params = ('network_id', 'speed')
+    upstream = ()
+    upstream_params = ()
+
+    def __init__(self, context=None, params=None):
+        self.data = None
+        self.indicator = None
+        self.keywords = []
+        self.params = dict(params or {})
+
+        self.context = context if context is not None else JobContext(self.getenv('server_address', 'http://localhost:8000'))
+        self.server_address = self.context.server_address
+        self.upload = str(self.getenv('upload', self.context.upload)).lower() not in ('0', 'false', 'no')
+
+        self.store = ResultStore(self.getenv('result_store', None))
+        self.force = str(self.getenv('force', '0')).lower() in ('1', 'true', 'yes')
+        self.memoize = str(self.getenv('memoize', '0')).lower() in ('1', 'true', 'yes')
+        self.export_status = []
+        # upload_mode=delta sube solo las filas que cambiaron desde la ultima subida de delta_base
+        self.delta_upload = self.getenv('upload_mode', 'full') == 'delta'
+
+        self.load_env_variables()
+        self.make_hash()
+        self.make_result_hash()
+        pass
+
+    @property
+    def h(self):
+        return self.context.h
+
+    def getenv(self, key, default=None):
+        value = self.params.get(key, None)
+        if value is None:
+            value = os.getenv(key, default)
+        return value
+
+    def load_env_variables(self):
+        def get_dict_env(key):
+            s = self.getenv(key)
+            if isinstance(s, dict):
+                return s
+            s = s.replace("""'""", '''"''')
+            return json.loads(s)
+
+        self.project_name = self.getenv('project_name')
+        self.indicator_name = self.getenv('indicator_name')
+        self.project_status = get_dict_env('project_status')
+        pass
+
+    def generate_unique_code(self, strings):
+        return generate_unique_code(strings)
+
+    def make_hash(self):
+        strings = [self.project_name]
+        [strings.append(f'{k}{v}') for k, v in self.project_status.items()]
+        self.indicator_hash = self.generate_unique_code(strings)
+        pass
+
+    def get_hash_params(self):
+        params = {key: self.getenv(key, None) for key in self.hash_params}
+        return {key: str(value) for key, value in params.items() if value is not None}
+
+    def get_upstream(self):
+        names = list(self.upstream) + [self.getenv(key, None) for key in self.upstream_params]
+        return [name for name in names if name]
+
+    def upstream_result_hash(self, indicator_name):
+        """result_hash of an upstream stage for this scenario: from the job context or the local store."""
+        result_hash = self.context.result_hash(indicator_name, self.indicator_hash)
+        if result_hash is None:
+            manifest = self.store.manifest(indicator_name, self.indicator_hash)
+            result_hash = manifest['result_hash'] if manifest is not None else None
+        return result_hash
+
+    def make_result_hash(self):
+        strings = [self.indicator_name, self.indicator_hash]
+        [strings.append(f'{k}{v}') for k, v in sorted(self.get_hash_params().items())]
+        # Un cambio en una etapa anterior cambia su result_hash y con el el de esta etapa
+        upstream = {name: self.upstream_result_hash(name) for name in self.get_upstream()}
+        [strings.append(f'{name}{result_hash}') for name, result_hash in sorted(upstream.items())]
+        # Sin el result_hash de una etapa anterior no se puede saber si un resultado guardado sigue valido
+        self.memoizable = all(result_hash is not None for result_hash in upstream.values())
+        self.result_hash = self.generate_unique_code(strings)
+        pass
+
+    def backend_has_result(self, max_bytes=65536):
+        """Whether the backend holds rows for this indicator_hash.
+
+        The answer is streamed and at most ``max_bytes`` are read: a longer
+        one has rows, and a shorter one is parsed (see ``has_rows``), so the
+        layer is never downloaded whole. limit/page_size ask a paginated
+        backend for a single row.
+        """
+        params = {'indicator_name': self.indicator_name, 'indicator_hash': self.indicator_hash, 'limit': 1, 'page_size': 1}
+
+        async def probe():
+            async with self.context.client.make_client() as client:
+                async with client.stream('GET', '/urban-indicators/indicatordata/', params=params) as response:
+                    if response.status_code != 200:
+                        return False
+                    body = b''
+                    async for chunk in response.aiter_bytes():
+                        body += chunk
+                        if len(body) > max_bytes:
+                            return True
+            return has_rows(body)
+
+        try:
+            return asyncio.run(probe())
+        except httpx.HTTPError:
+            return False
+
+    def load_memoized(self):
+        if self.force or not self.memoize or not self.memoizable:
+            return False
+        manifest = self.store.manifest(self.indicator_name, self.indicator_hash)
+        if manifest is not None and manifest['result_hash'] == self.result_hash:
+            df = self.store.load(self.indicator_name, self.result_hash)
+            if df is not None:
+                print(f'Result {self.result_hash} found in the local store')
+                self.df_out = df
+                self.context.store_result(self.indicator_name, self.indicator_hash, df, self.result_hash)
+                if self.upload and not manifest['uploaded']:
+                    self.export_indicator()
+                    self.remember_result()
+                return True
+        # El backend no guarda los parametros, por lo que su resultado solo se usa si se pide explicitamente
+        if str(self.getenv('memo_backend', '0')).lower() in ('1', 'true', 'yes') and self.backend_has_result():
+            print(f'Result for {self.indicator_hash} found in the backend')
+            return True
+        return False
+
+    def remember_result(self):
+        # Sin memoize el frame no se vuelve a leer; las subidas delta guardan aparte solo los hashes de filas
+        if self.df_out is None or not self.memoize:
+            return
+        uploaded = bool(self.export_status) and all(status == 200 for status, _ in self.export_status)
+        try:
+            self.store.save(self.indicator_name, self.indicator_hash, self.result_hash, self.df_out, self.get_hash_params(), uploaded)
+        except OSError as e:
+            print('Error saving result to the local store:', e)
+        pass
+
+    def get_network_id(self):
+        id_network = self.getenv('network_id', None)
+        return int(id_network) if id_network is not None else None
+
+    def load_indicator_data(self, indicator_name):
+        data = self.context.indicator_data(indicator_name, self.indicator_hash)
+        # Una linea JSON como las de los pasos (metrics_log=none la omite)
+        if self.getenv('metrics_log', 'json') == 'json':
+            event = {
+                'event': 'load',
+                'module': self.indicator_name,
+                'indicator': indicator_name,
+                'indicator_hash': self.indicator_hash,
+                'rows': None if data is None else len(data),
+            }
+            print(json.dumps(event), flush=True)
+        return data
+
+    @timed
+    def set_nodes_gdf(self):
+        self.nodes_gdf = self.context.nodes_gdf(self.get_network_id())
+        pass
+
+    @timed
+    def add_travel_time(self, df=None):
+        self.speed = float(self.getenv('speed', 4.5))
+
+        speed_m_per_min = self.speed * 1000 / 60
+
+        df = self.df_out if df is None else df
+        df['travel_time'] = df['path_length'] / speed_m_per_min
+        pass
+
+    def make_payload(self, indicator_name, df_out, row_keys=None):
+        if row_keys is not None:
+            # Con subidas delta cada fila lleva su clave para que el backend pueda actualizarla o borrarla
+            df_out = df_out.assign(row_key=row_keys.astype(str).values)
+        data = {
+            'indicator_name': indicator_name,
+            'indicator_hash': self.indicator_hash,
+            'is_geo': True,
+            'json_data': json_ready(df_out).to_json(),
+        }
+        return json.dumps(data)
+
+    def get_delta_base(self):
+        return self.getenv('delta_base', self.indicator_hash)
+
+    def plan_delta(self, indicator_name, df_out):
+        """Row hashes of ``df_out`` and the delta payload against the last upload of delta_base.
+
+        The payload is None when a full upload is due: no previous upload,
+        keys that are not unique or more than delta_max_ratio of the rows
+        changed. It is False when nothing changed since the last upload.
+
+        When delta_base is another indicator_hash (a scenario derived from
+        the base run), the backend must first copy the rows of base_hash
+        into indicator_hash and then apply the delta. It answers with the
+        resulting row count (``{"rows": n}``), which ``send_delta`` checks.
+        """
+        key = self.getenv('delta_key', None)
+        rows = row_hashes(df_out, key.split(',') if key else None)
+        previous = self.store.load_rows(indicator_name, self.get_delta_base())
+        if previous is None or rows['row_key'].duplicated().any():
+            return rows, None
+
+        inserted, updated, deleted = diff_rows(previous, rows)
+        changed = inserted | updated
+        print(f'{indicator_name}: {inserted.sum()} inserted, {updated.sum()} updated, {len(deleted)} deleted of {len(rows)} rows')
+        if changed.sum() + len(deleted) > float(self.getenv('delta_max_ratio', 0.3)) * max(len(rows), len(previous)):
+            return rows, None
+        if not changed.any() and not len(deleted) and self.get_delta_base() == self.indicator_hash:
+            return rows, False
+
+        df_changed = json_ready(df_out[changed]).assign(
+            row_key=rows['row_key'].values[changed].astype(str),
+            change=np.where(inserted[changed], 'insert', 'update'),
+        )
+        data = {
+            'indicator_name': indicator_name,
+            'indicator_hash': self.indicator_hash,
+            'base_hash': self.get_delta_base(),
+            'is_geo': True,
+            'key_column': 'row_key',
+            'json_data': df_changed.to_json(),
+            'deleted': [str(row_key) for row_key in deleted],
+        }
+        return rows, json.dumps(data)
+
+    async def send_payload(self, client, endpoint, json_data):
+        try:
+            response = await self.context.client.post_json(client, endpoint, json_data)
+        except httpx.HTTPError as e:
+            print('Error saving data:', e)
+            return None, str(e)
+        if response.status_code == 200:
+            print('Data saved successfully')
+            return response.status_code, 'ok'
+        else:
+            print('Error saving data:', response.text)
+            return response.status_code, response.text
+
+    async def send_delta(self, client, json_data, n_rows):
+        """Post a delta and check the row count the backend reports for indicator_hash.
+
+        The count is required when the delta starts from another
+        indicator_hash, since a backend that ignores base_hash would leave
+        only the changed rows. A missing or wrong count returns status None
+        with 'unverified', and the caller uploads the full result.
+        """
+        try:
+            response = await self.context.client.post_json(client, '/urban-indicators/indicatordata/upload_delta/', json_data)
+        except httpx.HTTPError as e:
+            print('Error saving delta:', e)
+            return None, str(e)
+        if response.status_code != 200:
+            print('Error saving delta:', response.text)
+            return response.status_code, response.text
+        try:
+            count = response.json().get('rows')
+        except (ValueError, AttributeError):
+            count = None
+        if count is None and self.get_delta_base() == self.indicator_hash:
+            print('Delta saved successfully')
+            return 200, 'ok'
+        if count is None or int(count) != n_rows:
+            print(f'Delta left {count} rows instead of {n_rows}, uploading the full result')
+            return None, 'unverified'
+        print('Delta saved successfully')
+        return 200, 'ok'
+
+    async def post_delta(self, client, indicator_name, df_out):
+        rows, json_data = await asyncio.to_thread(self.plan_delta, indicator_name, df_out)
+        if json_data is False:
+            return 200, 'unchanged'
+        status = None, 'full upload'
+        if json_data is not None:
+            status = await self.send_delta(client, json_data, len(rows))
+        # Si el backend no acepta deltas (o no hay base) se reemplaza el resultado completo;
+        # upload_to_table agregaria una segunda copia de las filas, por eso no se usa upload_endpoint
+        if json_data is None or status[0] in (404, 405) or status[1] == 'unverified':
+            endpoint = f'/urban-indicators/indicatordata/{self.replace_endpoint}/'
+            json_data = await asyncio.to_thread(self.make_payload, indicator_name, df_out, rows['row_key'])
+            status = await self.send_payload(client, endpoint, json_data)
+        if status[0] == 200:
+            await asyncio.to_thread(self.store.save_rows, indicator_name, self.indicator_hash, rows)
+        return status
+
+    async def post_indicator(self, client, indicator_name, df_out, upload_endpoint=None):
+        if self.delta_upload and upload_endpoint is None:
+            return await self.post_delta(client, indicator_name, df_out)
+        endpoint = f'/urban-indicators/indicatordata/{upload_endpoint or self.upload_endpoint}/'
+        # La serializacion corre en un hilo para que se solape con las subidas en curso
+        json_data = await asyncio.to_thread(self.make_payload, indicator_name, df_out)
+        return await self.send_payload(client, endpoint, json_data)
+
+    def export_results(self, results, append=False, first=False):
+        """Keep every (indicator_name, df) in the context and upload them concurrently.
+
+        With ``append`` each df is one part of a larger result (a tile): it is
+        added to what the context already holds and posted to upload_to_table,
+        which adds rows instead of replacing the indicator. The ``first`` part
+        is posted to replace_endpoint instead, so a re-run replaces the rows
+        of the previous run rather than adding a second copy.
+        """
+        for indicator_name, df_out in results:
+            # El hash va una sola vez como metadato del frame, no repetido en cada fila
+            apply_dtype_policy(df_out).attrs['indicator_hash'] = self.indicator_hash
+            if append:
+                self.context.append_result(indicator_name, self.indicator_hash, df_out, self.result_hash)
+            else:
+                self.context.store_result(indicator_name, self.indicator_hash, df_out, self.result_hash)
+        if not self.upload:
+            return [(None, 'kept in memory') for _ in results]
+        upload_endpoint = None
+        if append:
+            upload_endpoint = self.replace_endpoint if first else 'upload_to_table'
+        calls = [
+            lambda client, indicator_name=indicator_name, df_out=df_out: self.post_indicator(client, indicator_name, df_out, upload_endpoint)
+            for indicator_name, df_out in results
+        ]
+        status = asyncio.run(self.context.client.gather(*calls))
+        self.export_status += status
+        return status
+
+    def export_result(self, indicator_name, df_out):
+        return self.export_results([(indicator_name, df_out)])[0]
+
+    @timed
+    def export_indicator(self):
+        # Sin df_out (calculo por tiles) cada parte ya fue exportada al calcularse
+        if self.df_out is not None:
+            self.export_result(self.indicator_name, self.df_out)
+        pass
+
+    def report_memory(self):
+        if self.df_out is None or str(self.getenv('memory_report', '0')).lower() not in ('1', 'true', 'yes'):
+            return
+        report = dict(memory_report(self.df_out), event='memory', module=self.indicator_name)
+        print(json.dumps(report), flush=True)
+        pass
+
+    def load_data(self):
+        pass
+
+    def calculate(self):
+        pass
+
+    @timed
+    def exec(self):
+        if self.load_memoized():
+            return
+        self.load_data()
+        self.calculate()
+        self.report_memory()
+        self.export_indicator()
+        self.remember_result()
+        pass
@@ -0,0 +1,162 @@
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS = [
+    ('wall_s', 'clbb_step_wall_seconds', 'Wall time spent in the step, summed over its calls'),
+    ('cpu_s', 'clbb_step_cpu_seconds', 'CPU time spent in the step, summed over its calls'),
+    ('peak_rss_bytes', 'clbb_step_peak_rss_bytes', 'Peak resident set size of the process when the step ended'),
+    ('rows', 'clbb_step_rows', 'Rows in the step output frame'),
+    ('calls', 'clbb_step_calls', 'Times the step ran'),
+]
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss esta en KB en Linux y en bytes en macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def count_rows(obj):
+    for attr in ('df_out', 'data'):
+        value = getattr(obj, attr, None)
+        if hasattr(value, '__len__') and hasattr(value, 'columns'):
+            return len(value)
+    return None
+
+
+class Recorder():
+    """Collects wall time, CPU time, peak RSS and row counts per step.
+
+    Steps nest: a step opened inside another one in the same thread is
+    recorded as 'parent.child' (steps run by tile worker threads start their
+    own path). Every finished step is logged as a JSON line unless
+    metrics_log=none; when the last open step ends and metrics_path is set
+    the records are also written there as OpenMetrics text, one series per
+    (module, step, status). A metrics_path that is a directory (or contains
+    '{module}') gets one file per module, so the stages of a pipeline do not
+    overwrite each other.
+    """
+    def __init__(self, name=None, metrics_path=None, log_format=None):
+        self.name = name
+        self.records = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.open_steps = 0
+        self.log_format = log_format or os.getenv('metrics_log', 'json')
+        self.metrics_path = metrics_path if metrics_path is not None else os.getenv('metrics_path', None)
+        pass
+
+    @property
+    def stack(self):
+        # Cada hilo tiene su propia pila, asi los tiles en paralelo no mezclan nombres de pasos
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def step(self, name):
+        stack = self.stack
+        stack.append(name)
+        with self.lock:
+            self.open_steps += 1
+        record = {'module': self.name, 'step': '.'.join(stack), 'rows': None}
+        wall, cpu = time.perf_counter(), time.process_time()
+        status = 'error'
+        try:
+            yield record
+            status = 'ok'
+        finally:
+            record.update(
+                wall_s=time.perf_counter() - wall,
+                cpu_s=time.process_time() - cpu,
+                peak_rss_bytes=peak_rss_bytes(),
+                status=status,
+            )
+            stack.pop()
+            with self.lock:
+                self.records.append(record)
+                self.open_steps -= 1
+                finished = self.open_steps == 0
+            self.log(record)
+            if finished and self.metrics_path:
+                self.write_openmetrics(self.output_path())
+
+    def log(self, record):
+        if self.log_format == 'json':
+            print(json.dumps(dict(record, event='step')), flush=True)
+        pass
+
+    def output_path(self):
+        module = self.name or 'clbb'
+        if '{module}' in self.metrics_path:
+            return self.metrics_path.format(module=module)
+        if self.metrics_path.endswith(os.sep) or os.path.isdir(self.metrics_path):
+            os.makedirs(self.metrics_path, exist_ok=True)
+            return os.path.join(self.metrics_path, f'{module}.prom')
+        return self.metrics_path
+
+    def aggregate(self):
+        """One entry per (module, step, status): times summed, peak RSS max, rows of the last call."""
+        totals = {}
+        with self.lock:
+            records = list(self.records)
+        for record in records:
+            key = (record['module'], record['step'], record['status'])
+            total = totals.setdefault(key, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_bytes': 0, 'rows': None})
+            total['calls'] += 1
+            total['wall_s'] += record['wall_s']
+            total['cpu_s'] += record['cpu_s']
+            total['peak_rss_bytes'] = max(total['peak_rss_bytes'], record['peak_rss_bytes'])
+            if record.get('rows') is not None:
+                total['rows'] = record['rows']
+        return totals
+
+    def to_openmetrics(self):
+        totals = self.aggregate()
+        lines = []
+        for key, metric, help_text in METRICS:
+            lines.append(f'# TYPE {metric} gauge')
+            lines.append(f'# HELP {metric} {help_text}')
+            for (module, step, status), total in totals.items():
+                if total.get(key) is None:
+                    continue
+                labels = f'module="{module}",step="{step}",status="{status}"'
+                lines.append(f'{metric}{{{labels}}} {total[key]}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write_openmetrics(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_openmetrics())
+        pass
+
+
+def get_recorder(obj):
+    recorder = getattr(obj, 'recorder', None)
+    if recorder is None:
+        # Con getenv (indicadores) la configuracion sale de los params de cada etapa y no solo del entorno
+        getenv = getattr(obj, 'getenv', os.getenv)
+        recorder = Recorder(
+            getattr(obj, 'indicator_name', None) or type(obj).__module__,
+            metrics_path=getenv('metrics_path', None),
+            log_format=getenv('metrics_log', 'json'),
+        )
+        obj.recorder = recorder
+    return recorder
+
+
+def timed(method):
+    """Record a lifecycle method of an Indicator/Processing as a step."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with get_recorder(self).step(method.__name__) as record:
+            result = method(self, *args, **kwargs)
+            record['rows'] = count_rows(self)
+        return result
+    return wrapper
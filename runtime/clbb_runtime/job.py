@@ -0,0 +1,29 @@
+import importlib.util
+import os
+
+from clbb_runtime.context import JobContext
+
+
+def load_indicator_class(app_dir, name=None):
+    """Indicator class of a module given its app directory."""
+    name = name or os.path.basename(os.path.dirname(os.path.abspath(app_dir)))
+    spec = importlib.util.spec_from_file_location(f'clbb_stage_{name}', os.path.join(app_dir, 'indicator.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Indicator
+
+
+def run_stages(stages, context=None):
+    """Run indicators one after the other in this process sharing a JobContext.
+
+    ``stages`` is a list of ``(app_dir, params)``; ``params`` override the
+    environment for that stage only. Later stages read the results of earlier
+    ones from memory through the context.
+    """
+    context = context if context is not None else JobContext()
+    indicators = []
+    for app_dir, params in stages:
+        indicator = load_indicator_class(app_dir)(context=context, params=params)
+        indicator.exec()
+        indicators.append(indicator)
+    return indicators
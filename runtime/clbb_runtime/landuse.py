@@ -0,0 +1,100 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+
+def parquet_geo_metadata(path):
+    import pyarrow.parquet as pq
+    return json.loads(pq.read_schema(path).metadata[b'geo'])
+
+
+def parquet_crs(path):
+    """CRS declared for the primary geometry column of a GeoParquet file."""
+    metadata = parquet_geo_metadata(path)
+    return metadata['columns'][metadata['primary_column']].get('crs', 'OGC:CRS84')
+
+
+def read_parquet_bbox(path, bbox, columns=None):
+    """Read the rows of a GeoParquet file that may intersect ``bbox``.
+
+    ``bbox`` is (minx, miny, maxx, maxy) in the file's CRS. When the file
+    declares a bbox covering column (GeoParquet 1.1) the filter is pushed
+    down to pyarrow, which skips row groups through their statistics and
+    never decodes the geometries outside the box. Otherwise the whole file
+    is read and filtered by bounds.
+    """
+    import pyarrow.dataset as ds
+
+    metadata = parquet_geo_metadata(path)
+    geometry_column = metadata['primary_column']
+    covering = metadata['columns'][geometry_column].get('covering', {}).get('bbox')
+    read_columns = columns + [geometry_column] if columns else None
+    if covering is None:
+        gdf = gpd.read_parquet(path, columns=read_columns)
+        return gdf.cx[bbox[0]:bbox[2], bbox[1]:bbox[3]]
+
+    minx, miny, maxx, maxy = bbox
+    field = lambda key: ds.field(*covering[key])
+    row_filter = (field('xmin') <= maxx) & (field('xmax') >= minx) & (field('ymin') <= maxy) & (field('ymax') >= miny)
+    table = ds.dataset(path, format='parquet').to_table(columns=read_columns, filter=row_filter)
+
+    df = table.to_pandas()
+    df = df.drop(columns=covering['xmin'][0], errors='ignore')
+    geometry = gpd.GeoSeries.from_wkb(df.pop(geometry_column), crs=parquet_crs(path))
+    return gpd.GeoDataFrame(df, geometry=geometry)
+
+
+def clip_areas(parcels, scopes, weight_col=None, metric_crs=32718):
+    """Area of every parcel that falls inside every scope it intersects.
+
+    Candidate (parcel, scope) pairs come from the scopes' STRtree and are
+    clipped in one vectorized intersection. Returns one row per pair with
+    'scope_idx' (position in ``scopes``), 'parcel_idx' and 'area' in square
+    meters. With ``weight_col`` the parcel's own area attribute is scaled by
+    the fraction of the parcel inside the scope instead.
+    """
+    parcels = parcels.to_crs(metric_crs)
+    scopes = scopes.to_crs(metric_crs)
+    parcel_idx, scope_idx = scopes.sindex.query(parcels.geometry.values, predicate='intersects')
+
+    parcel_geoms = parcels.geometry.values[parcel_idx]
+    clipped = shapely.intersection(parcel_geoms, scopes.geometry.values[scope_idx])
+    area = shapely.area(clipped)
+    if weight_col is not None:
+        full_area = shapely.area(parcel_geoms)
+        fraction = np.divide(area, full_area, out=np.zeros_like(area), where=full_area > 0)
+        area = parcels[weight_col].values[parcel_idx] * fraction
+
+    pairs = pd.DataFrame({'scope_idx': scope_idx, 'parcel_idx': parcel_idx, 'area': area})
+    return pairs[pairs['area'] > 0]
+
+
+def shannon_entropy(frame, by, category_col, weight_col):
+    """Shannon entropy (bits) of ``category_col`` weighted by ``weight_col``.
+
+    One value per group of ``by``, computed for every group in the same
+    groupby: p = weight of the category / weight of the group and
+    H = -sum(p * log2(p)).
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    totals = frame.groupby(by + [category_col], observed=True)[weight_col].sum().reset_index()
+    totals = totals[totals[weight_col] > 0]
+    share = totals[weight_col] / totals.groupby(by)[weight_col].transform('sum')
+    totals['info'] = -share * np.log2(share)
+    return totals.groupby(by)['info'].sum().rename('entropy')
+
+
+def row_entropy(weights):
+    """Shannon entropy (bits) of every row of a (rows x categories) weight matrix.
+
+    Rows without weight get an entropy of 0.
+    """
+    weights = np.asarray(weights, dtype=float)
+    totals = weights.sum(axis=1, keepdims=True)
+    share = np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+    info = np.zeros_like(share)
+    np.multiply(-share, np.log2(share, out=np.zeros_like(share), where=share > 0), out=info)
+    return info.sum(axis=1)
@@ -0,0 +1,176 @@
+import gzip
+import json
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import shapely
+
+EXTENT = 4096
+# Mitad del ancho del mundo en Web Mercator (EPSG:3857), en metros
+WORLD = 20037508.342789244
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator bounds (xmin, ymin, xmax, ymax) of tile z/x/y (XYZ scheme)."""
+    size = 2 * WORLD / 2 ** z
+    xmin = -WORLD + x * size
+    ymax = WORLD - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def tile_range(bounds, z):
+    """Ranges of tile columns and rows at zoom ``z`` covering Web Mercator ``bounds``."""
+    n = 2 ** z
+    size = 2 * WORLD / n
+    xmin, ymin, xmax, ymax = bounds
+    clamp = lambda v: min(max(int(v), 0), n - 1)
+    xs = range(clamp((xmin + WORLD) // size), clamp((xmax + WORLD) // size) + 1)
+    ys = range(clamp((WORLD - ymax) // size), clamp((WORLD - ymin) // size) + 1)
+    return xs, ys
+
+
+def pixel_size(z):
+    """Size in meters of one tile unit (1/EXTENT of the tile) at zoom ``z``."""
+    return 2 * WORLD / 2 ** z / EXTENT
+
+
+def zoom_layer(gdf, z, simplify_px=1.0, thin_px=4.0, thin_by=('category',)):
+    """Features of ``gdf`` (in EPSG:3857) as shown at zoom ``z``.
+
+    Lines and polygons are simplified to ``simplify_px`` tile units; points
+    are thinned to one per ``thin_px`` tile units (and per ``thin_by``
+    value), which keeps low zooms of dense grids small.
+    """
+    geoms = gdf.geometry.values
+    points = np.asarray(shapely.get_type_id(geoms) == 0)
+    if points.all():
+        cell = pixel_size(z) * thin_px
+        keys = gdf[[col for col in thin_by if col in gdf.columns]].copy()
+        keys['_cx'] = np.floor(shapely.get_x(geoms) / cell).astype(np.int64)
+        keys['_cy'] = np.floor(shapely.get_y(geoms) / cell).astype(np.int64)
+        return gdf[~keys.duplicated().values]
+    layer = gdf.copy()
+    layer[gdf.geometry.name] = gdf.geometry.simplify(pixel_size(z) * simplify_px)
+    return layer[~layer.geometry.is_empty]
+
+
+def properties(df):
+    """Plain-python properties per row, without nulls (MVT has no null values)."""
+    records = json.loads(df.to_json(orient='records', double_precision=4))
+    return [{key: value for key, value in record.items() if value is not None} for record in records]
+
+
+def encode_tile(layer_name, layer, columns, bounds, buffer_px=64):
+    """MVT bytes of the features of ``layer`` within ``bounds`` (plus a buffer), or None."""
+    import mapbox_vector_tile
+
+    buffer = (bounds[2] - bounds[0]) / EXTENT * buffer_px
+    xmin, ymin, xmax, ymax = bounds
+    idx = layer.sindex.query(shapely.box(xmin - buffer, ymin - buffer, xmax + buffer, ymax + buffer), predicate='intersects')
+    if len(idx) == 0:
+        return None
+    part = layer.iloc[np.sort(idx)]
+    geoms = shapely.clip_by_rect(part.geometry.values, xmin - buffer, ymin - buffer, xmax + buffer, ymax + buffer)
+    features = [
+        {'geometry': geom, 'properties': props}
+        for geom, props in zip(geoms, properties(part[columns]))
+        if not geom.is_empty
+    ]
+    if not features:
+        return None
+    return mapbox_vector_tile.encode(
+        [{'name': layer_name, 'features': features}],
+        default_options={'quantize_bounds': bounds, 'extents': EXTENT},
+    )
+
+
+def field_type(series):
+    if pd.api.types.is_bool_dtype(series):
+        return 'Boolean'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'Number'
+    return 'String'
+
+
+class DirectoryWriter():
+    """Tiles as {path}/{z}/{x}/{y}.pbf plus a metadata.json."""
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def write(self, z, x, y, data):
+        directory = os.path.join(self.path, str(z), str(x))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'{y}.pbf'), 'wb') as f:
+            f.write(data)
+        pass
+
+    def close(self, metadata):
+        with open(os.path.join(self.path, 'metadata.json'), 'w') as f:
+            json.dump(metadata, f)
+        pass
+
+
+class MBTilesWriter():
+    """Tiles in an MBTiles (SQLite) file, gzip-compressed and with TMS rows as the spec requires."""
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if os.path.exists(path):
+            os.remove(path)
+        self.db = sqlite3.connect(path)
+        self.db.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+        self.db.execute('CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+        self.db.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+
+    def write(self, z, x, y, data):
+        self.db.execute('INSERT INTO tiles VALUES (?, ?, ?, ?)', (z, x, 2 ** z - 1 - y, gzip.compress(data)))
+        pass
+
+    def close(self, metadata):
+        rows = [(key, value if isinstance(value, str) else json.dumps(value)) for key, value in metadata.items() if key != 'vector_layers']
+        rows.append(('json', json.dumps({'vector_layers': metadata['vector_layers']})))
+        self.db.executemany('INSERT INTO metadata VALUES (?, ?)', rows)
+        self.db.commit()
+        self.db.close()
+        pass
+
+
+def write_pyramid(gdf, path, layer_name, minzoom=10, maxzoom=16, attributes=None, full_attributes_zoom=None, simplify_px=1.0, thin_px=4.0):
+    """Write ``gdf`` as a vector tile pyramid to a directory or to ``path`` ending in .mbtiles.
+
+    Below ``full_attributes_zoom`` (default ``maxzoom``) only the columns in
+    ``attributes`` are kept, if given. Returns the number of tiles written.
+    """
+    gdf = gdf[~gdf.geometry.isna()].to_crs(3857)
+    if gdf.empty:
+        return 0
+    columns = [col for col in gdf.columns if col != gdf.geometry.name]
+    thin_columns = [col for col in (attributes or columns) if col in columns]
+    full_attributes_zoom = maxzoom if full_attributes_zoom is None else full_attributes_zoom
+
+    writer = MBTilesWriter(path) if path.endswith('.mbtiles') else DirectoryWriter(path)
+    count = 0
+    for z in range(minzoom, maxzoom + 1):
+        layer = zoom_layer(gdf, z, simplify_px=simplify_px, thin_px=thin_px) if z < maxzoom else gdf
+        layer_columns = columns if z >= full_attributes_zoom else thin_columns
+        xs, ys = tile_range(layer.total_bounds, z)
+        for x in xs:
+            for y in ys:
+                data = encode_tile(layer_name, layer, layer_columns, tile_bounds(z, x, y))
+                if data is not None:
+                    writer.write(z, x, y, data)
+                    count += 1
+
+    west, south, east, north = gdf.to_crs(4326).total_bounds
+    writer.close({
+        'name': layer_name,
+        'format': 'pbf',
+        'minzoom': str(minzoom),
+        'maxzoom': str(maxzoom),
+        'bounds': f'{west},{south},{east},{north}',
+        'center': f'{(west + east) / 2},{(south + north) / 2},{minzoom}',
+        'vector_layers': [{'id': layer_name, 'fields': {col: field_type(gdf[col]) for col in columns}, 'minzoom': minzoom, 'maxzoom': maxzoom}],
+    })
+    return count
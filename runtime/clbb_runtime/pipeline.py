@@ -0,0 +1,120 @@
+"""Run chained indicators from a declarative DAG in a single process.
+
+    python -m clbb_runtime.pipeline --config admin/config/pipelines/proximity.json
+
+Stages share one JobContext, so layers are loaded once and each stage reads
+its upstream result from memory. Only the stages listed in OUTPUTS are
+uploaded, and stages whose dependencies are done run in parallel.
+"""
+import argparse
+import json
+import os
+import traceback
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from clbb_runtime.context import JobContext
+from clbb_runtime.job import load_indicator_class
+
+
+def topological_order(stages):
+    pending = {name: set(stage.get('DEPENDS_ON', [])) for name, stage in stages.items()}
+    for name, deps in pending.items():
+        unknown = deps - set(stages)
+        if unknown:
+            raise ValueError(f'Stage {name} depends on unknown stages: {sorted(unknown)}')
+    order = []
+    while pending:
+        ready = sorted(name for name, deps in pending.items() if not deps - set(order))
+        if not ready:
+            raise ValueError(f'Cycle between stages: {sorted(pending)}')
+        for name in ready:
+            order.append(name)
+            pending.pop(name)
+    return order
+
+
+class Pipeline():
+    def __init__(self, config, root='.', context=None):
+        self.config = config
+        self.root = root
+        self.stages = config['STAGES']
+        self.order = topological_order(self.stages)
+        self.outputs = set(config.get('OUTPUTS', self.order))
+        self.workers = int(config.get('WORKERS', 2))
+
+        self.context = context if context is not None else JobContext(
+            config.get('SERVER_ADDRESS', None),
+            upload=False,
+            handoff=config.get('HANDOFF', 'memory'),
+        )
+        self.status = {}
+        self.indicators = {}
+        pass
+
+    def stage_params(self, name):
+        stage = self.stages[name]
+        params = {'indicator_name': name}
+        params.update(self.config.get('ENV', {}))
+        params.update(stage.get('ENV', {}))
+        params['upload'] = name in self.outputs
+        return params
+
+    def run_stage(self, name):
+        stage = self.stages[name]
+        app_dir = os.path.join(self.root, stage['MODULE'], 'app')
+        indicator = load_indicator_class(app_dir, name)(context=self.context, params=self.stage_params(name))
+        indicator.exec()
+        self.indicators[name] = indicator
+        pass
+
+    def ready_stages(self, done, running):
+        ready = []
+        for name in self.order:
+            if name in done or name in running or name in self.status:
+                continue
+            deps = set(self.stages[name].get('DEPENDS_ON', []))
+            if any(self.status.get(dep) in ('error', 'skipped') for dep in deps):
+                self.status[name] = 'skipped'
+                print(f'{name}: skipped, an upstream stage failed')
+            elif deps <= done:
+                ready.append(name)
+        return ready
+
+    def run(self):
+        done = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while True:
+                for name in self.ready_stages(done, running.values()):
+                    running[executor.submit(self.run_stage, name)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        self.status[name] = 'ok'
+                        done.add(name)
+                    except Exception:
+                        traceback.print_exc()
+                        self.status[name] = 'error'
+                    print(f'{name}: {self.status[name]}')
+        return self.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', required=True)
+    parser.add_argument('--root', default='.', help='directory that contains the indicators folder')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    status = Pipeline(config, root=args.root).run()
+    if any(s != 'ok' for s in status.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
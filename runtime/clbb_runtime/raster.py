@@ -0,0 +1,148 @@
+import os
+import re
+import shutil
+
+import numpy as np
+
+from clbb_runtime.grid import grid_origin
+
+# Filas por bloque al llenar las bandas mapeadas en disco
+BLOCK_ROWS = 256
+RASTER_FORMATS = ('tif', 'npz')
+
+
+class GridSurface():
+    """Raster surfaces of a grid_points result, one array per (category, value column).
+
+    Cells are the points of grid.mesh_points: a point at (col, row) is the
+    center of pixel (height - 1 - row, col), so the raster is north-up and
+    shares the mesh origin. Tiles can be added one at a time; with
+    ``directory`` the arrays are memory-mapped files there, so only the
+    windows a tile touches are paged in, and they are removed once written.
+    """
+
+    def __init__(self, polygons, x_spacing, y_spacing, origin=None, value_cols=('path_length', 'travel_time'), metric_crs=32718, directory=None):
+        x0, y0 = origin if origin is not None else grid_origin(polygons, metric_crs)
+        _, _, xmax, ymax = polygons.to_crs(metric_crs).total_bounds
+        self.width = max(int(np.ceil((xmax - x0) / x_spacing)), 1)
+        self.height = max(int(np.ceil((ymax - y0) / y_spacing)), 1)
+        # Coeficientes (a, b, c, d, e, f) de la transformacion afin, en el orden de GDAL/rasterio
+        self.transform = (x_spacing, 0.0, x0 - x_spacing / 2, 0.0, -y_spacing, y0 + (self.height - 0.5) * y_spacing)
+        self.crs = metric_crs
+        self.value_cols = value_cols
+        self.directory = directory
+        self.bands = {}
+
+    def new_band(self, category, value_col):
+        if self.directory is None:
+            return np.full((self.height, self.width), np.nan, dtype=np.float32)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{file_name(category)}.{value_col}.f32')
+        band = np.memmap(path, dtype=np.float32, mode='w+', shape=(self.height, self.width))
+        # Se llena por bloques de filas para no traer todo el archivo a memoria de una vez
+        for start in range(0, self.height, BLOCK_ROWS):
+            band[start:start + BLOCK_ROWS] = np.nan
+        return band
+
+    def add(self, df):
+        """Write the values of ``df`` (with col, row and category columns) into the surfaces."""
+        for category, part in df.groupby('category', observed=True, sort=False):
+            rows = self.height - 1 - part['row'].to_numpy(np.int64)
+            cols = part['col'].to_numpy(np.int64)
+            for value_col in self.value_cols:
+                if value_col not in part.columns:
+                    continue
+                band = self.bands.get((category, value_col))
+                if band is None:
+                    band = self.bands[(category, value_col)] = self.new_band(category, value_col)
+                band[rows, cols] = part[value_col].to_numpy(np.float32)
+        pass
+
+    def categories(self):
+        return list(dict.fromkeys(category for category, _ in self.bands))
+
+    def write(self, directory, raster_format='tif'):
+        """Write one file per category into ``directory`` and return their paths.
+
+        With ``raster_format`` 'tif' files are Cloud-Optimized GeoTIFFs with
+        one band per value column, which needs rasterio; with 'npz' they are
+        compressed NumPy arrays with the transform and CRS.
+        """
+        check_format(raster_format)
+        os.makedirs(directory, exist_ok=True)
+
+        paths = []
+        for category in self.categories():
+            names = [col for col in self.value_cols if (category, col) in self.bands]
+            bands = [self.bands[(category, col)] for col in names]
+            path = os.path.join(directory, file_name(category))
+            if raster_format == 'tif':
+                paths.append(write_cog(f'{path}.tif', bands, names, self.transform, self.crs))
+            else:
+                paths.append(write_npz(f'{path}.npz', bands, names, self.transform, self.crs))
+        self.close()
+        return paths
+
+    def close(self):
+        """Drop the arrays, and their files when they are memory-mapped."""
+        self.bands = {}
+        if self.directory is not None and os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        pass
+
+
+def check_format(raster_format):
+    """Raise when ``raster_format`` is unknown or, for 'tif', when rasterio is not installed."""
+    if raster_format not in RASTER_FORMATS:
+        raise ValueError(f'Unknown raster_format {raster_format!r}, expected one of {", ".join(RASTER_FORMATS)}')
+    if raster_format == 'tif':
+        try:
+            import rasterio  # noqa: F401
+        except ImportError:
+            raise ImportError('GeoTIFF rasters need rasterio (pip install clbb-runtime[raster]); set raster_format=npz to write NumPy arrays instead')
+    pass
+
+
+def file_name(category):
+    return re.sub(r'[^\w-]+', '_', str(category))
+
+
+def write_cog(path, bands, names, transform, crs, blocksize=256):
+    """Write ``bands`` as a tiled, deflate-compressed GeoTIFF with internal overviews (COG layout).
+
+    Bands are written in windows of ``blocksize`` rows, so memory-mapped
+    bands are never read whole.
+    """
+    import rasterio
+    import rasterio.shutil
+    from rasterio.enums import Resampling
+    from rasterio.transform import Affine
+    from rasterio.windows import Window
+
+    height, width = bands[0].shape
+    profile = dict(
+        driver='GTiff', width=width, height=height, count=len(bands), dtype='float32',
+        crs=f'EPSG:{crs}', transform=Affine(*transform), nodata=np.nan,
+    )
+    creation = dict(tiled=True, blockxsize=blocksize, blockysize=blocksize, compress='deflate', predictor=3)
+    staging = f'{path}.staging.tif'
+    with rasterio.open(staging, 'w', **profile, **creation) as dst:
+        for i, (band, name) in enumerate(zip(bands, names), start=1):
+            for start in range(0, height, blocksize):
+                block = np.asarray(band[start:start + blocksize])
+                dst.write(block, i, window=Window(0, start, width, block.shape[0]))
+            dst.set_band_description(i, name)
+        factors = [2 ** i for i in range(1, 6) if max(width, height) / 2 ** i >= blocksize / 2]
+        if factors:
+            dst.build_overviews(factors, Resampling.average)
+    # Las overviews se copian antes que la imagen completa, que es lo que pide un COG
+    rasterio.shutil.copy(staging, path, driver='GTiff', copy_src_overviews=True, **creation)
+    os.remove(staging)
+    return path
+
+
+def write_npz(path, bands, names, transform, crs):
+    """Write ``bands`` as a compressed NumPy archive with the geotransform and CRS."""
+    arrays = {name: band for name, band in zip(names, bands)}
+    np.savez_compressed(path, transform=np.asarray(transform, dtype=np.float64), crs=np.asarray(crs), **arrays)
+    return path
@@ -0,0 +1,83 @@
+"""Evaluate many project_status variants of a pipeline in one run.
+
+    python -m clbb_runtime.scenarios --config admin/config/pipelines/proximity.json \
+        --scenarios admin/config/scenarios/example.json
+
+Each scenario is either a project_status dict or
+{"project_status": {...}, "edits": {"amenities": {"add": ..., "remove": [...]}}}.
+The network and the layers are loaded once and shared by every scenario;
+a scenario sees its edited layers with its edits applied over the shared
+ones (see clbb_runtime.context.apply_layer_edits), and partial results are
+reused when their inputs did not change. A scenario without edits has the
+same inputs as the base layers. Each scenario is uploaded under the hash of
+its own project_status.
+"""
+import argparse
+import copy
+import json
+
+from clbb_runtime.context import JobContext
+from clbb_runtime.pipeline import Pipeline
+
+
+def parse_scenario(scenario):
+    """(project_status, layer edits) of one entry of the scenarios list."""
+    if 'project_status' in scenario:
+        return scenario['project_status'], scenario.get('edits', {})
+    return scenario, {}
+
+
+class ScenarioBatch():
+    def __init__(self, config, scenarios, root='.'):
+        self.config = config
+        self.scenarios = scenarios
+        self.root = root
+        self.context = JobContext(
+            config.get('SERVER_ADDRESS', None),
+            upload=False,
+            handoff=config.get('HANDOFF', 'memory'),
+        )
+        self.status = []
+        pass
+
+    def scenario_config(self, project_status):
+        config = copy.deepcopy(self.config)
+        config.setdefault('ENV', {})['project_status'] = project_status
+        return config
+
+    def run(self):
+        for i, scenario in enumerate(self.scenarios):
+            project_status, edits = parse_scenario(scenario)
+            print(f'Scenario {i + 1}/{len(self.scenarios)}: {project_status}')
+            if not edits:
+                print('  no layer edits: computed over the base layers')
+            context = self.context.scenario(edits)
+            pipeline = Pipeline(self.scenario_config(project_status), root=self.root, context=context)
+            status = pipeline.run()
+            hashes = {name: indicator.indicator_hash for name, indicator in pipeline.indicators.items()}
+            self.status.append({'project_status': project_status, 'status': status, 'hashes': hashes})
+        return self.status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', required=True)
+    parser.add_argument('--scenarios', default=None, help='JSON file with a list of project_status dicts; defaults to SCENARIOS in the config')
+    parser.add_argument('--root', default='.')
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    if args.scenarios:
+        with open(args.scenarios) as f:
+            scenarios = json.load(f)
+    else:
+        scenarios = config['SCENARIOS']
+
+    status = ScenarioBatch(config, scenarios, root=args.root).run()
+    if any(s != 'ok' for scenario in status for s in scenario['status'].values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import json
+import os
+import time
+
+import geopandas as gpd
+import pandas as pd
+
+
+class ResultStore():
+    """Local store of indicator results keyed by their result hash.
+
+    For every (indicator_name, indicator_hash) a manifest records which
+    result_hash was last produced, the parameters behind it and whether it
+    was uploaded. The frame itself is kept as GeoParquet next to it (only
+    for the last result_hash), and the row hashes of the last upload (used
+    by delta uploads) as Parquet. Indicators only save frames with
+    memoize=1.
+    """
+    def __init__(self, path=None):
+        self.path = path or os.getenv('result_store', '/app/tmp/results')
+        pass
+
+    def manifest_path(self, indicator_name, indicator_hash):
+        return os.path.join(self.path, indicator_name, f'{indicator_hash}.json')
+
+    def frame_path(self, indicator_name, result_hash):
+        return os.path.join(self.path, indicator_name, f'{result_hash}.parquet')
+
+    def rows_path(self, indicator_name, indicator_hash):
+        return os.path.join(self.path, indicator_name, f'{indicator_hash}.rows.parquet')
+
+    def manifest(self, indicator_name, indicator_hash):
+        path = self.manifest_path(indicator_name, indicator_hash)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def load(self, indicator_name, result_hash):
+        path = self.frame_path(indicator_name, result_hash)
+        if not os.path.exists(path):
+            return None
+        return gpd.read_parquet(path)
+
+    def load_rows(self, indicator_name, indicator_hash):
+        """Row hashes of the last uploaded version of a result, or None."""
+        path = self.rows_path(indicator_name, indicator_hash)
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def save_rows(self, indicator_name, indicator_hash, rows):
+        os.makedirs(os.path.join(self.path, indicator_name), exist_ok=True)
+        rows.reset_index(drop=True).to_parquet(self.rows_path(indicator_name, indicator_hash))
+        pass
+
+    def save(self, indicator_name, indicator_hash, result_hash, df, params, uploaded):
+        """Save ``df`` as the result of (indicator_name, indicator_hash).
+
+        Only the last result of each indicator_hash is kept: the frame of the
+        result_hash it replaces is removed.
+        """
+        os.makedirs(os.path.join(self.path, indicator_name), exist_ok=True)
+        df.to_parquet(self.frame_path(indicator_name, result_hash))
+        previous = self.manifest(indicator_name, indicator_hash)
+        if previous is not None and previous['result_hash'] != result_hash:
+            stale = self.frame_path(indicator_name, previous['result_hash'])
+            if os.path.exists(stale):
+                os.remove(stale)
+        manifest = {
+            'indicator_name': indicator_name,
+            'indicator_hash': indicator_hash,
+            'result_hash': result_hash,
+            'params': params,
+            'uploaded': uploaded,
+            'created_at': time.time(),
+        }
+        with open(self.manifest_path(indicator_name, indicator_hash), 'w') as f:
+            json.dump(manifest, f)
+        pass
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+
+import httpx
+import pytest
+
+from clbb_runtime.client import ApiClient
+
+BODY = b'{"features": [' + b'{"id": 1, "value": 0.5},' * 200 + b'{}]}'
+
+
+def run(api, handler, method, path, **kwargs):
+    async def main():
+        async with httpx.AsyncClient(base_url=api.server_address, transport=httpx.MockTransport(handler)) as client:
+            return await api.request(client, method, path, **kwargs)
+    return asyncio.run(main())
+
+
+def test_request_bodies_are_not_compressed_by_default(monkeypatch):
+    monkeypatch.delenv('api_compression', raising=False)
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get('Content-Encoding'))
+        return httpx.Response(200)
+
+    response = run(ApiClient('http://api', backoff=0.001), handler, 'POST', '/api/upload/', content=BODY)
+    assert response.status_code == 200
+    assert seen == [None]
+
+
+def test_compressed_body_falls_back_on_415():
+    seen = []
+
+    def handler(request):
+        encoding = request.headers.get('Content-Encoding')
+        seen.append(encoding)
+        if encoding == 'gzip':
+            assert gzip.decompress(request.content) == BODY
+            return httpx.Response(415)
+        return httpx.Response(200)
+
+    api = ApiClient('http://api', backoff=0.001, compression='gzip')
+    assert run(api, handler, 'POST', '/api/upload/', content=BODY).status_code == 200
+    assert run(api, handler, 'POST', '/api/upload/', content=BODY).status_code == 200
+    assert seen == ['gzip', None, None]
+
+
+def test_compressed_body_falls_back_on_400():
+    seen = []
+
+    def handler(request):
+        encoding = request.headers.get('Content-Encoding')
+        seen.append(encoding)
+        return httpx.Response(400 if encoding else 201)
+
+    api = ApiClient('http://api', backoff=0.001, compression='gzip')
+    assert run(api, handler, 'POST', '/api/upload/', content=BODY).status_code == 201
+    assert seen == ['gzip', None]
+    assert api.rejected == {'gzip'}
+
+
+def test_plain_400_keeps_the_codec():
+    def handler(request):
+        return httpx.Response(400)
+
+    api = ApiClient('http://api', backoff=0.001, compression='gzip')
+    assert run(api, handler, 'POST', '/api/upload/', content=BODY).status_code == 400
+    assert api.rejected == set()
+
+
+def test_get_is_retried_on_5xx():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(503 if len(calls) < 3 else 200)
+
+    response = run(ApiClient('http://api', retries=3, backoff=0.001), handler, 'GET', '/api/layer/')
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+def test_post_is_not_retried_on_5xx_or_read_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        return httpx.Response(503)
+
+    api = ApiClient('http://api', retries=3, backoff=0.001)
+    assert run(api, handler, 'POST', '/api/upload/', content=b'{}').status_code == 503
+    assert len(calls) == 1
+
+    def timeout(request):
+        calls.append(request.method)
+        raise httpx.ReadTimeout('timed out', request=request)
+
+    calls.clear()
+    with pytest.raises(httpx.ReadTimeout):
+        run(api, timeout, 'POST', '/api/upload/', content=b'{}')
+    assert len(calls) == 1
+
+
+def test_post_is_retried_on_connect_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        if len(calls) < 2:
+            raise httpx.ConnectError('refused', request=request)
+        return httpx.Response(201)
+
+    response = run(ApiClient('http://api', retries=3, backoff=0.001), handler, 'POST', '/api/upload/', content=b'{}')
+    assert response.status_code == 201
+    assert len(calls) == 2
+
+
+def test_gather_is_bounded_and_returns_exceptions():
+    running, peak = [0], [0]
+
+    async def call(client, i):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    api = ApiClient('http://api', max_connections=2)
+    results = asyncio.run(api.gather(*[lambda client, i=i: call(client, i) for i in range(6)], return_exceptions=True))
+    assert peak[0] == 2
+    assert results[:3] == [0, 1, 2] and results[4:] == [4, 5]
+    assert isinstance(results[3], ValueError)
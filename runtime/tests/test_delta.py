@@ -0,0 +1,120 @@
+import json
+
+import geopandas as gpd
+import httpx
+import pytest
+from shapely.geometry import Point
+
+from clbb_runtime.client import ApiClient
+from clbb_runtime.context import JobContext
+from clbb_runtime.delta import diff_rows, row_hashes
+from clbb_runtime.indicator import BaseIndicator
+
+
+def make_frame(values, codes=('a', 'b', 'c')):
+    return gpd.GeoDataFrame(
+        {'code': list(codes), 'category': ['park'] * len(codes), 'path_length': values},
+        geometry=[Point(i, i) for i in range(len(codes))],
+        crs=4326,
+    )
+
+
+class TableIndicator(BaseIndicator):
+    upload_endpoint = 'upload_to_table'
+
+    def calculate(self):
+        pass
+
+
+def make_indicator(tmp_path, **params):
+    base = {
+        'project_name': 'test',
+        'project_status': {'status': 'base'},
+        'indicator_name': 'table',
+        'result_store': str(tmp_path / 'store'),
+        'upload': '1',
+        'upload_mode': 'delta',
+        'delta_max_ratio': '0.5',
+    }
+    base.update(params)
+    return TableIndicator(context=JobContext('http://api', upload=True), params=base)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    """Posted (path, payload) pairs; the response per path can be set in ``backend.responses``."""
+    class Backend(list):
+        responses = {}
+
+    posted = Backend()
+
+    def handler(request):
+        posted.append((request.url.path, json.loads(request.content)))
+        status, body = posted.responses.get(request.url.path, (200, {}))
+        return httpx.Response(status, json=body)
+
+    monkeypatch.setattr(ApiClient, 'make_client', lambda self: httpx.AsyncClient(base_url=self.server_address, transport=httpx.MockTransport(handler)))
+    return posted
+
+
+def test_row_hashes_ignore_float_noise_and_row_order():
+    df = make_frame([100.0, 200.0, 300.0])
+    noisy = make_frame([100.0001, 200.0, 300.0])
+    assert (row_hashes(df)['row_hash'].values == row_hashes(noisy)['row_hash'].values).all()
+
+    reversed_rows = row_hashes(df.iloc[::-1])
+    assert sorted(reversed_rows['row_key']) == sorted(row_hashes(df)['row_key'])
+    assert row_hashes(df, key=['code'])['row_key'].is_unique
+
+
+def test_diff_rows_finds_inserted_updated_and_deleted_rows():
+    current = row_hashes(make_frame([100.0, 250.0, 400.0], codes=('a', 'b', 'd')), key=['code'])
+    previous = row_hashes(make_frame([100.0, 200.0, 300.0]), key=['code'])
+
+    inserted, updated, deleted = diff_rows(previous, current)
+    assert inserted.tolist() == [False, False, True]
+    assert updated.tolist() == [False, True, False]
+    assert deleted.tolist() == previous['row_key'].values[[2]].tolist()
+
+
+def test_delta_fallback_replaces_instead_of_appending(tmp_path, backend):
+    indicator = make_indicator(tmp_path)
+    indicator.export_result('table', make_frame([100.0, 200.0, 300.0]))
+    assert [path for path, _ in backend] == ['/urban-indicators/indicatordata/update_indicator/']
+
+    backend.clear()
+    backend.responses['/urban-indicators/indicatordata/upload_delta/'] = (404, {})
+    indicator = make_indicator(tmp_path)
+    indicator.export_result('table', make_frame([100.0, 250.0, 300.0]))
+    assert [path for path, _ in backend] == [
+        '/urban-indicators/indicatordata/upload_delta/',
+        '/urban-indicators/indicatordata/update_indicator/',
+    ]
+
+
+def test_delta_sends_only_changed_rows(tmp_path, backend):
+    make_indicator(tmp_path).export_result('table', make_frame([100.0, 200.0, 300.0]))
+    backend.clear()
+
+    status = make_indicator(tmp_path).export_result('table', make_frame([100.0, 250.0, 300.0]))
+    assert status == (200, 'ok')
+    (path, payload), = backend
+    assert path == '/urban-indicators/indicatordata/upload_delta/'
+    assert len(json.loads(payload['json_data'])['features']) == 1
+
+
+def test_delta_from_another_base_needs_the_row_count(tmp_path, backend):
+    base = make_indicator(tmp_path)
+    base.export_result('table', make_frame([100.0, 200.0, 300.0]))
+    scenario = {'project_status': {'status': 'scenario'}, 'delta_base': base.indicator_hash}
+
+    # Sin conteo de filas no se sabe si el backend copio la base: se sube el resultado completo
+    backend.clear()
+    make_indicator(tmp_path, **scenario).export_result('table', make_frame([100.0, 250.0, 300.0]))
+    assert [path for path, _ in backend][-1] == '/urban-indicators/indicatordata/update_indicator/'
+
+    backend.clear()
+    backend.responses['/urban-indicators/indicatordata/upload_delta/'] = (200, {'rows': 3})
+    status = make_indicator(tmp_path, **scenario).export_result('table', make_frame([100.0, 250.0, 300.0]))
+    assert status == (200, 'ok')
+    assert [path for path, _ in backend] == ['/urban-indicators/indicatordata/upload_delta/']
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from clbb_runtime.frames import compact_paths
+
+
+def paths():
+    return pd.DataFrame({
+        'source': [1, 1, 2, 2, 3],
+        'category': ['a', 'a', 'b', 'b', 'a'],
+        'destination': [10, 11, 12, 13, 14],
+        'path_length': [np.nan, np.nan, np.nan, np.nan, 50.0],
+    })
+
+
+def test_compact_paths_drops_unreachable_pairs():
+    df = compact_paths(paths())
+    assert df[['source', 'destination']].values.tolist() == [[3, 14]]
+    assert df['destination'].dtype == np.int64
+
+
+def test_compact_paths_keeps_unreachable_pairs_with_a_null_destination():
+    df = compact_paths(paths(), unreachable='keep')
+    assert df['source'].tolist() == [1, 2, 3]
+    assert df['destination'].dtype == 'Int64'
+    assert df['destination'].isna().tolist() == [True, True, False]
+    assert df['destination'].iloc[2] == 14
+    assert df['path_length'].isna().tolist() == [True, True, False]
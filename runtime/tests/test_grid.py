@@ -0,0 +1,30 @@
+import geopandas as gpd
+from shapely.geometry import Polygon, box
+
+from clbb_runtime.grid import grid_origin, mesh_points, tile_mesh_points, to_metric
+
+
+def cells(points):
+    return list(zip(points['col'], points['row']))
+
+
+def test_points_on_a_shared_tile_edge_are_kept_once():
+    area = to_metric(gpd.GeoDataFrame(geometry=[box(350000, 6290000, 350600, 6290600)], crs=32718))
+    # Dos tiles que comparten una diagonal que pasa por 11 puntos de la malla
+    tiles = gpd.GeoDataFrame({'tile_id': ['a', 'b']}, geometry=[
+        Polygon([(350000, 6290000), (350600, 6290000), (350000, 6290600)]),
+        Polygon([(350600, 6290000), (350600, 6290600), (350000, 6290600)]),
+    ], crs=32718)
+    origin = grid_origin(area)
+
+    tiled = []
+    for _, tile in tiles.iterrows():
+        tiled += cells(tile_mesh_points(area, tile, 50, 50, origin, kind='h3'))
+    assert len(tiled) == len(set(tiled))
+    assert sorted(tiled) == sorted(cells(mesh_points(area, 50, 50)))
+
+
+def test_to_metric_keeps_a_projected_frame():
+    area = gpd.GeoDataFrame(geometry=[box(350000, 6290000, 350600, 6290600)], crs=32718)
+    assert to_metric(area) is area
+    assert to_metric(area.to_crs(4326)).crs == area.crs
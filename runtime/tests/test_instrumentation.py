@@ -0,0 +1,62 @@
+import threading
+
+from clbb_runtime.instrumentation import Recorder, get_recorder, timed
+
+
+def series(text):
+    return [line.rsplit(' ', 1)[0] for line in text.splitlines() if not line.startswith('#')]
+
+
+def test_repeated_steps_are_one_series():
+    recorder = Recorder('mod', metrics_path='')
+    with recorder.step('run'):
+        for _ in range(3):
+            with recorder.step('tile'):
+                pass
+    text = recorder.to_openmetrics()
+    assert len(series(text)) == len(set(series(text)))
+    assert 'clbb_step_calls{module="mod",step="run.tile",status="ok"} 3' in text
+    assert text.endswith('# EOF\n')
+
+
+def test_steps_in_worker_threads_keep_their_own_path():
+    recorder = Recorder('mod', metrics_path='')
+    barrier = threading.Barrier(4)
+
+    def work():
+        with recorder.step('outer'):
+            barrier.wait()
+            with recorder.step('inner'):
+                barrier.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted({record['step'] for record in recorder.records}) == ['outer', 'outer.inner']
+
+
+class Stage():
+    def __init__(self, name, params):
+        self.indicator_name = name
+        self.params = params
+
+    def getenv(self, key, default=None):
+        return self.params.get(key, default)
+
+    @timed
+    def exec(self):
+        pass
+
+
+def test_metrics_path_from_params_and_one_file_per_module(tmp_path):
+    for name in ('first', 'second'):
+        Stage(name, {'metrics_path': str(tmp_path), 'metrics_log': 'none'}).exec()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['first.prom', 'second.prom']
+    assert 'module="second"' in (tmp_path / 'second.prom').read_text()
+
+    stage = Stage('third', {'metrics_path': str(tmp_path / 'm_{module}.txt'), 'metrics_log': 'none'})
+    stage.exec()
+    assert (tmp_path / 'm_third.txt').exists()
+    assert get_recorder(stage).log_format == 'none'
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from clbb_runtime.landuse import row_entropy, shannon_entropy
+
+
+def test_shannon_entropy_per_group():
+    frame = pd.DataFrame({
+        'scope': ['a', 'a', 'a', 'b', 'b', 'c'],
+        'use': ['home', 'shop', 'home', 'home', 'park', 'home'],
+        'area': [1.0, 2.0, 1.0, 1.0, 3.0, 5.0],
+    })
+    entropy = shannon_entropy(frame, 'scope', 'use', 'area')
+    # a: dos usos con la misma area; b: 1/4 y 3/4; c: un solo uso
+    assert entropy['a'] == pytest.approx(1.0)
+    assert entropy['b'] == pytest.approx(-(0.25 * np.log2(0.25) + 0.75 * np.log2(0.75)))
+    assert entropy['c'] == pytest.approx(0.0)
+
+
+def test_shannon_entropy_ignores_zero_weights_and_groups_by_several_columns():
+    frame = pd.DataFrame({
+        'scope': ['a', 'a', 'a', 'a'],
+        'radius': [300, 300, 300, 600],
+        'use': ['home', 'shop', 'park', 'home'],
+        'area': [1.0, 1.0, 0.0, 2.0],
+    })
+    entropy = shannon_entropy(frame, ['scope', 'radius'], 'use', 'area')
+    assert entropy[('a', 300)] == pytest.approx(1.0)
+    assert entropy[('a', 600)] == pytest.approx(0.0)
+
+
+def test_row_entropy_matches_the_grouped_entropy():
+    weights = np.array([[1.0, 1.0, 0.0], [1.0, 3.0, 0.0], [0.0, 0.0, 0.0], [1.0, 1.0, 2.0]])
+    entropy = row_entropy(weights)
+    assert entropy == pytest.approx([1.0, -(0.25 * np.log2(0.25) + 0.75 * np.log2(0.75)), 0.0, 1.5])
+
+    frame = pd.DataFrame([
+        {'row': i, 'category': j, 'weight': w}
+        for i, row in enumerate(weights) for j, w in enumerate(row)
+    ])
+    grouped = shannon_entropy(frame, 'row', 'category', 'weight')
+    assert grouped.reindex(range(len(weights)), fill_value=0.0).values == pytest.approx(entropy)
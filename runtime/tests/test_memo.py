@@ -0,0 +1,208 @@
+import json
+import os
+
+import geopandas as gpd
+import httpx
+import pytest
+from shapely.geometry import Point
+
+from clbb_runtime.client import ApiClient
+from clbb_runtime.context import JobContext
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.job import load_indicator_class
+from clbb_runtime.store import ResultStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class CountIndicator(BaseIndicator):
+    upstream = ('upstream_stage',)
+    calls = 0
+
+    def calculate(self):
+        CountIndicator.calls += 1
+        self.df_out = gpd.GeoDataFrame({'value': [1.5, 2.5]}, geometry=[Point(0, 0), Point(1, 1)], crs=4326)
+
+
+def make_params(tmp_path, **params):
+    base = {
+        'project_name': 'test',
+        'project_status': {'status': 'base'},
+        'indicator_name': 'count',
+        'result_store': str(tmp_path / 'store'),
+        'upload': '0',
+        'memoize': '1',
+    }
+    base.update(params)
+    return base
+
+
+def make_context(upstream_hash='up1'):
+    context = JobContext('http://api', upload=False)
+    ihash = CountIndicator(context=context, params={'project_name': 'test', 'project_status': {'status': 'base'}, 'indicator_name': 'count', 'upload': '0'}).indicator_hash
+    if upstream_hash is not None:
+        context.result_hashes[('upstream_stage', ihash)] = upstream_hash
+    return context
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    CountIndicator.calls = 0
+
+
+def test_result_store_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path))
+    df = gpd.GeoDataFrame({'value': [1.0]}, geometry=[Point(0, 0)], crs=4326)
+    store.save('name', 'ihash', 'rhash', df, {'speed': '4.5'}, uploaded=True)
+
+    manifest = store.manifest('name', 'ihash')
+    assert manifest['result_hash'] == 'rhash'
+    assert manifest['params'] == {'speed': '4.5'}
+    assert manifest['uploaded'] is True
+    assert store.load('name', 'rhash')['value'].tolist() == [1.0]
+    assert store.manifest('name', 'other') is None
+    assert store.load('name', 'other') is None
+
+
+def test_memo_hit_skips_calculation(tmp_path):
+    CountIndicator(context=make_context(), params=make_params(tmp_path)).exec()
+    indicator = CountIndicator(context=make_context(), params=make_params(tmp_path))
+    indicator.exec()
+    assert CountIndicator.calls == 1
+    assert indicator.df_out['value'].tolist() == [1.5, 2.5]
+
+
+def test_memo_miss_when_params_change(tmp_path):
+    CountIndicator(context=make_context(), params=make_params(tmp_path)).exec()
+    CountIndicator(context=make_context(), params=make_params(tmp_path, speed='5')).exec()
+    assert CountIndicator.calls == 2
+
+
+def test_memo_miss_when_upstream_result_changes(tmp_path):
+    CountIndicator(context=make_context('up1'), params=make_params(tmp_path)).exec()
+    CountIndicator(context=make_context('up2'), params=make_params(tmp_path)).exec()
+    assert CountIndicator.calls == 2
+
+
+def test_memo_disabled_without_upstream_hash_or_by_default(tmp_path):
+    CountIndicator(context=make_context(), params=make_params(tmp_path)).exec()
+    unknown = CountIndicator(context=make_context(None), params=make_params(tmp_path))
+    assert not unknown.memoizable
+    unknown.exec()
+    CountIndicator(context=make_context(), params=make_params(tmp_path, memoize='0')).exec()
+    assert CountIndicator.calls == 3
+
+
+def test_upstream_hash_is_read_from_the_store(tmp_path):
+    context = make_context(None)
+    indicator = CountIndicator(context=context, params=make_params(tmp_path))
+    df = gpd.GeoDataFrame({'value': [1.0]}, geometry=[Point(0, 0)], crs=4326)
+    indicator.store.save('upstream_stage', indicator.indicator_hash, 'stored', df, {}, True)
+    assert CountIndicator(context=context, params=make_params(tmp_path)).memoizable
+
+
+def test_aggregation_memo_hit_reexports_pyramid(tmp_path, monkeypatch):
+    posted = []
+
+    def handler(request):
+        posted.append(request.url.path)
+        return httpx.Response(200, json={'status': 'ok'})
+
+    monkeypatch.setattr(ApiClient, 'make_client', lambda self: httpx.AsyncClient(base_url=self.server_address, transport=httpx.MockTransport(handler)))
+    Aggregation = load_indicator_class(os.path.join(ROOT, 'indicators', 'am_prox_aggregation', 'app'), 'am_prox_aggregation')
+    params = make_params(
+        tmp_path,
+        indicator_name='am_prox_aggregation',
+        indicator_to_aggregate='am_prox_grid_points',
+        resolutions='9,10',
+        upload='1',
+    )
+    context = JobContext('http://api', upload=True)
+    indicator = Aggregation(context=context, params=params)
+    context.result_hashes[('am_prox_grid_points', indicator.indicator_hash)] = 'grid'
+
+    indicator = Aggregation(context=context, params=params)
+    df = gpd.GeoDataFrame(
+        {'code': ['a', 'b'], 'category': ['school', 'school'], 'path_length': [100.0, 200.0], 'level': [10, 9]},
+        geometry=[Point(0, 0), Point(1, 1)],
+        crs=4326,
+    )
+    indicator.store.save(indicator.indicator_name, indicator.indicator_hash, indicator.result_hash, df, {}, uploaded=False)
+
+    indicator.exec()
+    assert len(posted) == 2
+    assert indicator.store.manifest(indicator.indicator_name, indicator.indicator_hash)['uploaded'] is True
+
+
+def test_results_are_only_stored_with_memoize(tmp_path):
+    indicator = CountIndicator(context=make_context(), params=make_params(tmp_path, memoize='0'))
+    indicator.exec()
+    assert indicator.store.manifest('count', indicator.indicator_hash) is None
+    assert not (tmp_path / 'store').exists()
+
+
+def test_store_keeps_only_the_last_frame(tmp_path):
+    store = ResultStore(str(tmp_path))
+    df = gpd.GeoDataFrame({'value': [1.0]}, geometry=[Point(0, 0)], crs=4326)
+    store.save('name', 'ihash', 'first', df, {}, uploaded=True)
+    store.save('name', 'ihash', 'second', df, {}, uploaded=True)
+    assert store.load('name', 'first') is None
+    assert sorted(path.name for path in (tmp_path / 'name').iterdir()) == ['ihash.json', 'second.parquet']
+
+
+@pytest.mark.parametrize('status, body, expected', [
+    (404, b'{}', False),
+    (200, b'[]', False),
+    (200, b'{"type": "FeatureCollection", "features": []}', False),
+    (200, b'{"count": 0, "results": []}', False),
+    (200, b'{"count": 12, "results": [{"id": 1}]}', True),
+    (200, b'[{"id": 1}]', True),
+])
+def test_backend_has_result_probes_without_downloading(tmp_path, monkeypatch, status, body, expected):
+    seen = []
+
+    def handler(request):
+        seen.append(dict(request.url.params))
+        return httpx.Response(status, content=body)
+
+    monkeypatch.setattr(ApiClient, 'make_client', lambda self: httpx.AsyncClient(base_url=self.server_address, transport=httpx.MockTransport(handler)))
+    indicator = CountIndicator(context=make_context(), params=make_params(tmp_path))
+    assert indicator.backend_has_result() is expected
+    assert seen[0]['indicator_hash'] == indicator.indicator_hash and seen[0]['limit'] == '1'
+
+
+def test_backend_has_result_stops_reading_a_long_answer(tmp_path, monkeypatch):
+    sent = []
+
+    async def chunks():
+        for _ in range(1000):
+            sent.append(1)
+            yield b'x' * 4096
+
+    monkeypatch.setattr(ApiClient, 'make_client', lambda self: httpx.AsyncClient(base_url=self.server_address, transport=httpx.MockTransport(lambda request: httpx.Response(200, content=chunks()))))
+    indicator = CountIndicator(context=make_context(), params=make_params(tmp_path))
+    assert indicator.backend_has_result() is True
+    assert len(sent) < 100
+
+
+@pytest.mark.parametrize('module', ['am_prox_grid_points', 'ga_prox_grid_points'])
+def test_grid_points_result_hash_depends_on_the_output_formats(tmp_path, module):
+    Grid = load_indicator_class(os.path.join(ROOT, 'indicators', module, 'app'), module)
+    hashes = {
+        Grid(context=make_context(), params=make_params(tmp_path, indicator_name=module, output_format=output_format, raster_format=raster_format)).result_hash
+        for output_format, raster_format in [('vector', 'tif'), ('both', 'npz'), ('raster', 'npz')]
+    }
+    assert len(hashes) == 3
+
+
+def test_load_indicator_data_logs_one_json_event(tmp_path, capsys):
+    context = make_context()
+    indicator = CountIndicator(context=context, params=make_params(tmp_path))
+    df = gpd.GeoDataFrame({'value': [1.0, 2.0]}, geometry=[Point(0, 0), Point(1, 1)], crs=4326)
+    context.store_result('upstream_stage', indicator.indicator_hash, df)
+
+    assert len(indicator.load_indicator_data('upstream_stage')) == 2
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [{
+        'event': 'load', 'module': 'count', 'indicator': 'upstream_stage', 'indicator_hash': indicator.indicator_hash, 'rows': 2,
+    }]
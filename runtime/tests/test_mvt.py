@@ -0,0 +1,31 @@
+import pytest
+
+from clbb_runtime.mvt import WORLD, tile_bounds, tile_range
+
+
+def test_tile_bounds_cover_the_world_at_zoom_zero():
+    assert tile_bounds(0, 0, 0) == pytest.approx((-WORLD, -WORLD, WORLD, WORLD))
+
+
+def test_tile_bounds_follow_the_xyz_scheme():
+    # En XYZ la fila 0 es la del norte
+    xmin, ymin, xmax, ymax = tile_bounds(1, 0, 0)
+    assert (xmin, ymin, xmax, ymax) == pytest.approx((-WORLD, 0.0, 0.0, WORLD))
+    xmin, ymin, xmax, ymax = tile_bounds(2, 3, 3)
+    assert (xmin, ymin, xmax, ymax) == pytest.approx((WORLD / 2, -WORLD, WORLD, -WORLD / 2))
+
+
+def test_tile_range_contains_the_tiles_of_the_bounds():
+    for z, x, y in [(10, 301, 620), (14, 4830, 9925)]:
+        xmin, ymin, xmax, ymax = tile_bounds(z, x, y)
+        # Un recuadro dentro del tile solo toca ese tile
+        inner = (xmin + 1, ymin + 1, xmax - 1, ymax - 1)
+        assert tile_range(inner, z) == (range(x, x + 1), range(y, y + 1))
+        # Uno que cruza la esquina inferior derecha toca los cuatro vecinos
+        corner = (xmax - 1, ymin - 1, xmax + 1, ymin + 1)
+        assert tile_range(corner, z) == (range(x, x + 2), range(y, y + 2))
+
+
+def test_tile_range_is_clamped_to_the_world():
+    xs, ys = tile_range((-2 * WORLD, -2 * WORLD, 2 * WORLD, 2 * WORLD), 3)
+    assert xs == range(0, 8) and ys == range(0, 8)
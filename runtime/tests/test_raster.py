@@ -0,0 +1,114 @@
+import os
+import tracemalloc
+
+import geopandas as gpd
+import httpx
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from clbb_runtime.client import ApiClient
+from clbb_runtime.context import JobContext
+from clbb_runtime.grid import grid_origin, make_tiles, mesh_points, tile_mesh_points
+from clbb_runtime.indicator import BaseIndicator
+from clbb_runtime.raster import GridSurface
+
+
+@pytest.fixture
+def area():
+    # Un cuadrado de 1 km x 600 m en UTM 18S
+    return gpd.GeoDataFrame(geometry=[box(350000, 6290000, 351000, 6290600)], crs=32718).to_crs(4326)
+
+
+def with_values(points):
+    return points.assign(category='park', path_length=points['col'] * 10.0 + points['row'])
+
+
+def test_tiled_surface_on_disk_matches_the_full_mesh(area, tmp_path):
+    full = GridSurface(area, 50, 50)
+    full.add(with_values(mesh_points(area, 50, 50)))
+
+    scratch = tmp_path / 'bands'
+    tiled = GridSurface(area, 50, 50, directory=str(scratch))
+    for _, tile in make_tiles(area, size=300).iterrows():
+        tiled.add(with_values(tile_mesh_points(area, tile, 50, 50, grid_origin(area))))
+    assert isinstance(tiled.bands[('park', 'path_length')], np.memmap)
+    np.testing.assert_array_equal(tiled.bands[('park', 'path_length')], full.bands[('park', 'path_length')])
+
+    paths = tiled.write(str(tmp_path / 'out'), 'npz')
+    assert [os.path.basename(path).split('.')[0] for path in paths] == ['park']
+    assert not scratch.exists()
+
+
+def test_geotiff_without_rasterio_fails_loudly(area, tmp_path):
+    try:
+        import rasterio  # noqa: F401
+        pytest.skip('rasterio is installed')
+    except ImportError:
+        pass
+    surface = GridSurface(area, 50, 50)
+    surface.add(with_values(mesh_points(area, 50, 50)))
+    with pytest.raises(ImportError, match='raster_format=npz'):
+        surface.write(str(tmp_path / 'out'))
+    with pytest.raises(ValueError):
+        surface.write(str(tmp_path / 'out'), 'png')
+    assert not (tmp_path / 'out').exists()
+
+
+class TileIndicator(BaseIndicator):
+    upload_endpoint = 'upload_to_table'
+
+    def calculate(self):
+        pass
+
+
+def test_tiles_replace_the_first_part_and_append_the_rest(area, tmp_path, monkeypatch):
+    posted = []
+
+    def handler(request):
+        posted.append(request.url.path)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(ApiClient, 'make_client', lambda self: httpx.AsyncClient(base_url=self.server_address, transport=httpx.MockTransport(handler)))
+    params = {'project_name': 'test', 'project_status': {}, 'indicator_name': 'tiles', 'result_store': str(tmp_path), 'upload': '1'}
+    indicator = TileIndicator(context=JobContext('http://api', upload=True), params=params)
+    points = with_values(mesh_points(area, 50, 50))
+    for i, part in enumerate(np.array_split(np.arange(len(points)), 3)):
+        indicator.export_results([('tiles', points.iloc[part])], append=True, first=i == 0)
+
+    assert posted == [
+        '/urban-indicators/indicatordata/update_indicator/',
+        '/urban-indicators/indicatordata/upload_to_table/',
+        '/urban-indicators/indicatordata/upload_to_table/',
+    ]
+    assert len(indicator.context.indicator_data('tiles', indicator.indicator_hash)) == len(points)
+
+
+def test_tile_parts_are_spilled_to_disk(tmp_path):
+    params = {'project_name': 'test', 'project_status': {}, 'indicator_name': 'tiles', 'result_store': str(tmp_path), 'upload': '0'}
+    indicator = TileIndicator(context=JobContext('http://api', upload=False), params=params)
+    rng = np.random.default_rng(0)
+
+    def make_tile(n=5000):
+        return gpd.GeoDataFrame(
+            {'category': 'park', 'path_length': rng.random(n), 'travel_time': rng.random(n)},
+            geometry=gpd.points_from_xy(rng.random(n), rng.random(n)),
+            crs=4326,
+        )
+
+    tracemalloc.start()
+    indicator.export_results([('tiles', make_tile())], append=True, first=True)
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(20):
+        indicator.export_results([('tiles', make_tile())], append=True)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # 20 tiles de ~200 KB cada uno: lo que queda en memoria no crece con ellos
+    assert after - before < 50_000
+    parts = indicator.context.results[('tiles', indicator.indicator_hash)]
+    assert len(parts) == 21 and all(os.path.isfile(part) for part in parts)
+    assert len(indicator.context.indicator_data('tiles', indicator.indicator_hash)) == 21 * 5000
+
+    indicator.context.discard_result('tiles', indicator.indicator_hash)
+    assert not any(os.path.exists(part) for part in parts)
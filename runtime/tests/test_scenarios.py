@@ -0,0 +1,88 @@
+import textwrap
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import Point
+
+from clbb_runtime.context import JobContext, apply_layer_edits
+from clbb_runtime.scenarios import ScenarioBatch, parse_scenario
+from clbb_runtime.store import ResultStore
+
+COUNT_MODULE = '''
+import geopandas as gpd
+from shapely.geometry import Point
+from clbb_runtime.indicator import BaseIndicator
+
+class Indicator(BaseIndicator):
+    def load_data(self):
+        self.amenities = self.context.amenities()
+
+    def calculate(self):
+        counts = self.amenities.groupby('category', observed=True).size().rename('count').reset_index()
+        self.df_out = gpd.GeoDataFrame(counts, geometry=[Point(0, 0)] * len(counts), crs=4326)
+'''
+
+
+def make_amenities():
+    return gpd.GeoDataFrame(
+        {'id': [1, 2, 3], 'category': ['school', 'school', 'park']},
+        geometry=[Point(0, 0), Point(1, 1), Point(2, 2)],
+        crs=4326,
+    )
+
+
+def test_apply_layer_edits_adds_and_removes():
+    added = {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [3, 3]}, 'properties': {'id': 4, 'category': 'park'}},
+    ]}
+    edited = apply_layer_edits(make_amenities(), {'remove': [1], 'add': added})
+    assert sorted(edited['id']) == [2, 3, 4]
+    assert edited.crs.to_epsg() == 4326
+
+
+def test_child_context_shares_unedited_layers():
+    parent = JobContext('http://api')
+    parent.layers['amenities'] = make_amenities()
+    parent.layers['green_areas'] = make_amenities()
+    child = parent.scenario({'amenities': {'remove': [3]}})
+    assert child.green_areas() is parent.green_areas()
+    assert list(child.amenities()['id']) == [1, 2]
+    assert len(parent.amenities()) == 3
+
+
+def test_parse_scenario_accepts_plain_project_status():
+    assert parse_scenario({'status': 'base'}) == ({'status': 'base'}, {})
+    assert parse_scenario({'project_status': {'status': 'p'}, 'edits': {'amenities': {}}}) == ({'status': 'p'}, {'amenities': {}})
+
+
+@pytest.fixture
+def count_root(tmp_path):
+    app = tmp_path / 'stages' / 'count' / 'app'
+    app.mkdir(parents=True)
+    (app / 'indicator.py').write_text(textwrap.dedent(COUNT_MODULE))
+    return tmp_path
+
+
+def test_scenarios_with_different_edits_produce_different_results(count_root, tmp_path):
+    config = {
+        'SERVER_ADDRESS': 'http://api',
+        'ENV': {'project_name': 'test', 'result_store': str(tmp_path / 'store'), 'memoize': '1'},
+        'OUTPUTS': [],
+        'STAGES': {'count': {'MODULE': 'stages/count'}},
+    }
+    scenarios = [
+        {'project_status': {'status': 'base'}},
+        {'project_status': {'status': 'p1'}, 'edits': {'amenities': {'remove': [1, 2]}}},
+    ]
+    batch = ScenarioBatch(config, scenarios, root=str(count_root))
+    batch.context.layers['amenities'] = make_amenities()
+    status = batch.run()
+
+    assert all(s['status'] == {'count': 'ok'} for s in status)
+    base_hash, p1_hash = [s['hashes']['count'] for s in status]
+    assert base_hash != p1_hash
+
+    store = ResultStore(str(tmp_path / 'store'))
+    base, p1 = [store.load('count', store.manifest('count', h)['result_hash']) for h in (base_hash, p1_hash)]
+    assert dict(zip(base['category'].astype(str), base['count'])) == {'park': 1, 'school': 2}
+    assert dict(zip(p1['category'].astype(str), p1['count'])) == {'park': 1}